@@ -1,32 +1,59 @@
 """
 Script to perform analytics on collected GitHub data
 """
-import pandas as pd
-from config import SINCE_DATE
+from config import SINCE_DATE, TEAMS
+from rollups import update_rollups
+from storage import get_storage, read_table
+from teams import team_dataframes
+
+# Only the columns the aggregations use are loaded, each table exactly once
+# (together with the ones teams.team_dataframes selects on)
+ANALYTICS_COLUMNS = {
+    "relevant_repos": ["name", "full_name", "created_at"],
+    "daily_rollup": None,
+}
 
 
 def load_dataframes():
-    """Load dataframes from CSV files."""
-    repos_df = pd.read_csv("relevant_repos.csv")
-    prs_df = pd.read_csv("relevant_prs.csv")
-    if not prs_df.empty:
-        prs_df["created_at"] = pd.to_datetime(prs_df["created_at"], utc=True)
-    comments_df = pd.read_csv("relevant_prs_comments.csv")
-    commits_df = pd.read_csv("relevant_prs_commits.csv")
-    commits_stats_df = pd.read_csv("commits_stats.csv")
-    
-    return repos_df, prs_df, comments_df, commits_df, commits_stats_df
+    """Load the repositories and the daily rollup the aggregations are computed from.
+
+    The rollup is built from the collected tables when data collected before
+    it existed is found without one.
+    """
+    storage = get_storage()
+    if not storage.exists("daily_rollup") and storage.exists("relevant_prs"):
+        update_rollups(storage)
+    return tuple(read_table(table, columns, storage) for table, columns in ANALYTICS_COLUMNS.items())
+
+
+def top_counts(counts, n, template):
+    """Format the first n entries of a value_counts series, or N/A when empty."""
+    if counts.empty:
+        return "N/A"
+    return ", ".join(template.format(key, count) for key, count in counts.head(n).items())
 
 
-def calculate_aggregations(repos_df, prs_df, comments_df, commits_df, commits_stats_df):
-    """Calculate all aggregations and statistics."""
+def rollup_counts(rollup_df, by, metric):
+    """Total metric per value of by (a column or series), largest first, leaving out zeros."""
+    totals = rollup_df.groupby(by)[metric].sum()
+    return totals[totals > 0].astype(int).sort_values(ascending=False, kind="stable")
+
+
+def calculate_aggregations(repos_df, rollup_df):
+    """Calculate all aggregations and statistics.
+
+    This is the single source of the numbers shown by print_results and written
+    to web/stats.json. Everything but the new repositories comes from the daily
+    rollup (see rollups.py), which can be restricted to any window of days
+    beforehand; the inputs are left unchanged.
+    """
     results = {}
     
     # Total repos worked on
     results["total_repos"] = len(repos_df)
     
     # Total PRs open
-    results["total_prs"] = len(prs_df)
+    results["total_prs"] = int(rollup_df["prs"].sum())
     
     # New repos created
     if not repos_df.empty:
@@ -36,64 +63,58 @@ def calculate_aggregations(repos_df, prs_df, comments_df, commits_df, commits_st
         results["new_repos"] = []
     
     # Most active month
-    if not prs_df.empty:
-        prs_df["created_month_name"] = prs_df["created_at"].dt.month_name()
-        top_month = prs_df["created_month_name"].value_counts()
-        results["top_month"] = (top_month.idxmax(), top_month.max())
+    month_counts = rollup_counts(rollup_df, rollup_df["day"].dt.month_name(), "prs")
+    if not month_counts.empty:
+        results["top_month"] = (month_counts.idxmax(), int(month_counts.max()))
     else:
         results["top_month"] = (None, 0)
     
     # Most active days
-    if not prs_df.empty:
-        prs_df["created_date"] = prs_df["created_at"].dt.date
-        top_3_pr_dates = prs_df["created_date"].value_counts().head(3)
-        results["top_3_pr_dates"] = ", ".join([f"{date}: {count}" for date, count in top_3_pr_dates.items()])
-    else:
-        results["top_3_pr_dates"] = "N/A"
+    date_counts = rollup_counts(rollup_df, rollup_df["day"].dt.date, "prs")
+    results["top_3_pr_dates"] = top_counts(date_counts, 3, "{}: {}")
     
     # Top PR openers
-    if not prs_df.empty:
-        top_5_pr_openers = prs_df["user_login"].value_counts().head(5)
-        results["top_5_pr_openers"] = ", ".join([f"{user}: {count}" for user, count in top_5_pr_openers.items()])
-    else:
-        results["top_5_pr_openers"] = "N/A"
+    opener_counts = rollup_counts(rollup_df, "user_login", "prs")
+    results["top_5_pr_openers"] = top_counts(opener_counts, 5, "{}: {}")
     
     # Top repos with most PRs opened
-    if not prs_df.empty:
-        top_3_repos = prs_df["repo_name"].value_counts().head(3)
-        results["top_3_repos"] = ", ".join([f"{repo_name}: {count} PRs opened" for repo_name, count in top_3_repos.items()])
+    repo_counts = rollup_counts(rollup_df, "repo_name", "prs")
+    results["top_3_repos"] = top_counts(repo_counts, 3, "{}: {} PRs opened")
+    if not repo_counts.empty:
+        results["most_active_repo"] = (repo_counts.index[0], int(repo_counts.iloc[0]))
     else:
-        results["top_3_repos"] = "N/A"
+        results["most_active_repo"] = (None, 0)
     
     # Top 3 commenters
-    if not comments_df.empty:
-        top_3_commenters = comments_df["user_login"].value_counts().head(3)
-        results["top_3_commenters"] = ", ".join([f"{user_login}: {count} comments" for user_login, count in top_3_commenters.items()])
-        results["total_comments"] = len(comments_df)
-    else:
-        results["top_3_commenters"] = "N/A"
-        results["total_comments"] = 0
+    commenter_counts = rollup_counts(rollup_df, "user_login", "comments")
+    results["top_3_commenters"] = top_counts(commenter_counts, 3, "{}: {} comments")
+    results["total_comments"] = int(rollup_df["comments"].sum())
     
     # LGTM counts
-    if not comments_df.empty:
-        lgtm_counts = comments_df[
-            comments_df["body"].str.contains("lgtm", case=False, na=False) | 
-            comments_df["body"].str.contains("looks good", case=False, na=False)
-        ]
-        results["lgtm_count"] = len(lgtm_counts)
-    else:
-        results["lgtm_count"] = 0
+    results["lgtm_count"] = int(rollup_df["lgtm_comments"].sum())
     
     # Total commits
-    results["total_commits"] = len(commits_df)
+    results["total_commits"] = int(rollup_df["commits"].sum())
+    
+    # Additions and deletions, unknown when no commit stats were collected
+    has_stats = rollup_df["additions"].notna().any()
+    results["total_additions"] = int(rollup_df["additions"].sum()) if has_stats else "?"
+    results["total_deletions"] = int(rollup_df["deletions"].sum()) if has_stats else "?"
     
-    # Additions and deletions
-    results["total_additions"] = "?" if commits_stats_df.empty else int(commits_stats_df["additions"].sum())
-    results["total_deletions"] = "?" if commits_stats_df.empty else int(commits_stats_df["deletions"].sum())
+    # Workflow runs
+    results["total_workflow_runs"] = int(rollup_df["workflow_runs"].sum())
+    results["successful_workflow_runs"] = int(rollup_df["successful_workflow_runs"].sum())
+    results["failed_workflow_runs"] = int(rollup_df["failed_workflow_runs"].sum())
     
     return results
 
 
+def calculate_team_aggregations(dataframes, teams=TEAMS):
+    """Return [(team, results)] for every team, from the shared dataframes of load_dataframes."""
+    return [(team, calculate_aggregations(*team_dataframes(team, *dataframes, teams=teams)))
+            for team in teams]
+
+
 def print_results(results):
     """Print formatted results."""
     print("\n" + "="*60)
@@ -123,11 +144,17 @@ def print_results(results):
     print("\n" + "="*60)
 
 
-if __name__ == "__main__":
-    print("Loading data from CSV files...")
-    repos_df, prs_df, comments_df, commits_df, commits_stats_df = load_dataframes()
+def main():
+    """Load the collected data and print the results of every team."""
+    print("Loading collected data...")
+    dataframes = load_dataframes()
     
     print("Calculating aggregations...")
-    results = calculate_aggregations(repos_df, prs_df, comments_df, commits_df, commits_stats_df)
-    
-    print_results(results)
+    for team, results in calculate_team_aggregations(dataframes):
+        if len(TEAMS) > 1:
+            print(f"\nTeam {team['name']} ({team['org']})")
+        print_results(results)
+
+
+if __name__ == "__main__":
+    main()
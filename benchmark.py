@@ -0,0 +1,556 @@
+"""
+Offline benchmark of the collection pipeline against a local fake GitHub API
+
+A fake GitHub REST server is started on localhost, serving synthetic
+organizations of increasing size with the same pagination (Link headers),
+rate limit headers and payload shapes as GitHub. It answers the GraphQL
+queries of graphql_collector.py too, so --graphql benchmarks that backend on
+the same data; nested connections are served NESTED_PAGE nodes at a time so
+their follow-up queries run as well. For each size the whole
+pipeline (collect_github_data, saving the tables, rollups and SQL store,
+calculate_aggregations and generate_stats_json) runs in a fresh process and
+working directory, so nothing is cached between sizes and peak memory is that
+of the size alone. Compare the reports before and after a change to the
+helpers.
+
+Usage:
+    python benchmark.py
+    python benchmark.py --sizes small,medium --latency 20 --rate-limit 2000
+    python benchmark.py --profile --keep
+    python benchmark.py --graphql
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+# Synthetic organizations: repositories, pull requests (since SINCE_DATE) per repository,
+# review and issue comments and commits per pull request, workflow runs per repository
+SIZES = {
+    "small": {"repos": 10, "prs": 10, "comments": 2, "commits": 3, "runs": 20},
+    "medium": {"repos": 40, "prs": 20, "comments": 3, "commits": 3, "runs": 50},
+    "large": {"repos": 120, "prs": 30, "comments": 3, "commits": 4, "runs": 150},
+}
+
+MEMBERS = [f"member{i}" for i in range(8)]
+
+COMMENT_BODIES = ["LGTM 👍", "nit: rename this?", "Thanks! Approved.", "Could you add a test?",
+                  "Looks good to me :rocket:", "Why is this needed? It breaks the build."]
+
+SINCE = datetime(2025, 1, 1)
+
+# Nodes per page of the comments, reviews and commits of a GraphQL pull request
+NESTED_PAGE = 2
+
+REPORT_PATH = "benchmark_report.json"
+
+
+def _timestamp(moment):
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _sizes(value):
+    """Sizes of the comma separated list value, which must all be in SIZES."""
+    sizes = value.split(",")
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown sizes {', '.join(unknown)} (known: {', '.join(SIZES)})")
+    return sizes
+
+
+class FakeGitHub:
+    """Deterministic synthetic GitHub data of the organizations bench-<size>."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    @staticmethod
+    def spec(org):
+        size = org[len("bench-"):] if org.startswith("bench-") else None
+        return SIZES.get(size)
+
+    @staticmethod
+    def pr_author(r, n, spec):
+        # Every fourth repository and pull request is by someone outside the team
+        if r % 4 == 3 or n % 4 == 3 or n > spec["prs"]:
+            return "outsider"
+        return MEMBERS[(r + n) % len(MEMBERS)]
+
+    def repos(self, org, spec):
+        return [{
+            "id": r + 1, "name": f"repo{r}", "full_name": f"{org}/repo{r}",
+            "created_at": _timestamp(datetime(2024 if r % 3 else 2025, 3, 1) + timedelta(days=r)),
+            "pushed_at": _timestamp(datetime(2025, 6, 1)),
+        } for r in range(spec["repos"])]
+
+    def prs(self, org, r, spec):
+        """Pull requests of repository r: spec["prs"] since SINCE_DATE and a fifth as many before it."""
+        repo = f"{org}/repo{r}"
+        prs = []
+        for n in range(1, spec["prs"] + spec["prs"] // 5 + 1):
+            if n <= spec["prs"]:
+                created = SINCE + timedelta(days=(n * 37 + r * 11) % 365, hours=n % 24)
+            else:
+                created = SINCE - timedelta(days=n)
+            prs.append({
+                "id": r * 100000 + n, "number": n, "title": f"Change {n}", "state": "closed",
+                "created_at": _timestamp(created), "updated_at": _timestamp(created + timedelta(days=2)),
+                "closed_at": _timestamp(created + timedelta(days=2)), "merged_at": None,
+                "html_url": f"https://github.com/{repo}/pull/{n}",
+                "user": {"login": self.pr_author(r, n, spec)},
+                "base": {"repo": {"full_name": repo}},
+                "head": {"ref": f"change-{n}", "repo": {"full_name": repo}},
+            })
+        return prs
+
+    def comments(self, org, r, n, kind, spec):
+        repo = f"{org}/repo{r}"
+        created = SINCE + timedelta(days=(n * 37 + r * 11) % 365, hours=n % 24 + 1)
+        return [{
+            "id": (r * 100000 + n) * 100 + k * 2 + (kind == "issues"),
+            "body": COMMENT_BODIES[(n + k) % len(COMMENT_BODIES)],
+            "created_at": _timestamp(created + timedelta(hours=k)),
+            "updated_at": _timestamp(created + timedelta(hours=k)),
+            "html_url": f"https://github.com/{repo}/pull/{n}#{kind}-{k}",
+            "user": {"login": MEMBERS[(r + n + k) % len(MEMBERS)]},
+            "reactions": {"total_count": (n + k) % 3, "+1": (n + k) % 3},
+        } for k in range(spec["comments"])]
+
+    def commits(self, org, r, n, spec):
+        repo = f"{org}/repo{r}"
+        created = SINCE + timedelta(days=(n * 37 + r * 11) % 365, hours=n % 24)
+        commits = []
+        for k in range(spec["commits"]):
+            sha = hashlib.sha1(f"{repo}/{n}/{k}".encode()).hexdigest()
+            author = {"name": "Dev", "date": _timestamp(created + timedelta(minutes=k))}
+            commits.append({
+                "sha": sha,
+                "commit": {"url": f"{self.base_url}/repos/{repo}/git/commits/{sha}",
+                           "message": f"Commit {k}", "author": author, "committer": author},
+                "author": {"login": self.pr_author(r, n, spec)},
+            })
+        return commits
+
+    def runs(self, org, r, spec):
+        repo = f"{org}/repo{r}"
+        return [{
+            "id": r * 100000 + spec["runs"] - k, "name": "CI", "event": "push", "status": "completed",
+            "conclusion": "failure" if k % 5 == 0 else "success", "run_number": spec["runs"] - k,
+            "head_branch": "main",
+            "created_at": _timestamp(SINCE + timedelta(days=364 - k * 300 // spec["runs"])),
+            "updated_at": _timestamp(SINCE + timedelta(days=364 - k * 300 // spec["runs"])),
+            "actor": {"login": MEMBERS[k % len(MEMBERS)]}, "repository": {"full_name": repo},
+        } for k in range(spec["runs"])]
+
+    def search_items(self, query):
+        """Items of a search/issues query "org:X author:Y is:pr created:>=DATE"."""
+        terms = dict(term.split(":", 1) for term in query.split() if ":" in term)
+        spec = self.spec(terms.get("org", ""))
+        if spec is None:
+            return []
+        since = terms.get("created", ">=").lstrip(">=")
+        return [{"repository_url": f"{self.base_url}/repos/{terms['org']}/repo{r}", "number": pr["number"]}
+                for r in range(spec["repos"]) for pr in self.prs(terms["org"], r, spec)
+                if pr["user"]["login"] == terms.get("author") and pr["created_at"] >= since]
+
+    @staticmethod
+    def _connection(nodes, first, after=None):
+        """GraphQL connection of the page of nodes after cursor after (an offset)."""
+        start = int(after or 0)
+        page = nodes[start:start + first]
+        end = start + len(page)
+        return {"pageInfo": {"hasNextPage": end < len(nodes), "endCursor": str(end)}, "nodes": page}
+
+    def _comment_node(self, comment):
+        return {"databaseId": comment["id"], "body": comment["body"], "createdAt": comment["created_at"],
+                "updatedAt": comment["updated_at"], "url": comment["html_url"], "author": comment["user"],
+                "reactions": {"totalCount": comment["reactions"]["total_count"]}}
+
+    def _commit_node(self, commit):
+        git_commit = commit["commit"]
+        additions = int(commit["sha"][:2], 16)
+        return {"commit": {
+            "oid": commit["sha"], "message": git_commit["message"],
+            "additions": additions, "deletions": additions // 3,
+            "author": dict(git_commit["author"], email="dev@example.com", user=commit["author"]),
+            "committer": dict(git_commit["committer"], email="dev@example.com"),
+        }}
+
+    def pr_connection(self, org, r, n, name, spec, after=None, first=NESTED_PAGE):
+        """Connection name (comments, reviews or commits) of pull request n of repository r."""
+        if name == "comments":
+            nodes = [self._comment_node(comment) for comment in self.comments(org, r, n, "issues", spec)]
+        elif name == "commits":
+            nodes = [self._commit_node(commit) for commit in self.commits(org, r, n, spec)]
+        else:
+            # One review holding the review comments
+            nodes = [{"id": f"PRR:{org}:{r}:{n}", "comments": self.review_comments(org, r, n, spec)}]
+        return self._connection(nodes, min(first, NESTED_PAGE), after)
+
+    def review_comments(self, org, r, n, spec, after=None, first=NESTED_PAGE):
+        nodes = [self._comment_node(comment) for comment in self.comments(org, r, n, "pulls", spec)]
+        return self._connection(nodes, min(first, NESTED_PAGE), after)
+
+    def pr_node(self, org, r, pr, spec):
+        n = pr["number"]
+        return {
+            "id": f"PR:{org}:{r}:{n}", "databaseId": pr["id"], "number": n, "title": pr["title"],
+            "state": pr["state"].upper(), "createdAt": pr["created_at"], "updatedAt": pr["updated_at"],
+            "closedAt": pr["closed_at"], "mergedAt": pr["merged_at"], "url": pr["html_url"],
+            "author": pr["user"], "baseRepository": {"nameWithOwner": pr["base"]["repo"]["full_name"]},
+            "headRefName": pr["head"]["ref"], "headRepository": {"nameWithOwner": pr["head"]["repo"]["full_name"]},
+            **{name: self.pr_connection(org, r, n, name, spec) for name in ("comments", "reviews", "commits")},
+        }
+
+    def graphql(self, query, variables):
+        """Data of a query of graphql_collector.py, or None when it is unknown."""
+        if "pullRequests(" in query:
+            spec = self.spec(variables["owner"])
+            match = re.fullmatch(r"repo(\d+)", variables["name"])
+            if spec is None or match is None:
+                return None
+            r = int(match.group(1))
+            key = "updated_at" if variables["orderBy"] == "UPDATED_AT" else "created_at"
+            prs = sorted(self.prs(variables["owner"], r, spec), key=lambda pr: pr[key], reverse=True)
+            first = int(re.search(r"pullRequests\(first: (\d+)", query).group(1))
+            connection = self._connection(prs, first, variables.get("cursor"))
+            connection["nodes"] = [self.pr_node(variables["owner"], r, pr, spec) for pr in connection["nodes"]]
+            return {"repository": {"pullRequests": connection}}
+        match = re.search(r"\.\.\. on (\w+) \{\s*(\w+)\(first: (\d+)", query)
+        if match is None:
+            return None
+        type_name, name, first = match.group(1), match.group(2), int(match.group(3))
+        _, org, r, n = variables["id"].split(":")
+        spec = self.spec(org)
+        if type_name == "PullRequestReview":
+            connection = self.review_comments(org, int(r), int(n), spec, variables.get("cursor"), first)
+        else:
+            connection = self.pr_connection(org, int(r), int(n), name, spec, variables.get("cursor"), first)
+        return {"node": {name: connection}}
+
+    def expected_prs(self, size):
+        """Number of team pull requests created since SINCE_DATE in bench-<size>."""
+        spec = SIZES[size]
+        return sum(self.pr_author(r, n, spec) != "outsider"
+                   for r in range(spec["repos"]) for n in range(1, spec["prs"] + 1))
+
+    def route(self, path, params):
+        """Return (data, listing key or None) for an API path, or None when it is unknown."""
+        segments = path.strip("/").split("/")
+        if segments[:1] == ["orgs"] and segments[2:] == ["repos"]:
+            spec = self.spec(segments[1])
+            return (self.repos(segments[1], spec), None) if spec else None
+        if segments == ["search", "issues"]:
+            return self.search_items(params.get("q", "")), "items"
+        if segments[:1] != ["repos"] or len(segments) < 4:
+            return None
+        org, repo, rest = segments[1], segments[2], segments[3:]
+        spec = self.spec(org)
+        match = re.fullmatch(r"repo(\d+)", repo)
+        if spec is None or match is None:
+            return None
+        r = int(match.group(1))
+        if rest == ["pulls"]:
+            key = "updated_at" if params.get("sort") == "updated" else "created_at"
+            return sorted(self.prs(org, r, spec), key=lambda pr: pr[key], reverse=True), None
+        if len(rest) == 3 and rest[0] in ("pulls", "issues") and rest[2] == "comments":
+            comments = self.comments(org, r, int(rest[1]), rest[0], spec)
+            if "since" in params:
+                comments = [c for c in comments if c["updated_at"] >= params["since"]]
+            return sorted(comments, key=lambda c: c["updated_at"], reverse=True), None
+        if len(rest) == 3 and rest[0] == "pulls" and rest[2] == "commits":
+            return self.commits(org, r, int(rest[1]), spec), None
+        if len(rest) == 2 and rest[0] == "commits":
+            additions = int(rest[1][:2], 16)
+            return {"sha": rest[1], "stats": {"additions": additions, "deletions": additions // 3}}, None
+        if rest == ["actions", "runs"]:
+            runs = self.runs(org, r, spec)
+            created = params.get("created", "").lstrip(">=")
+            if created:
+                runs = [run for run in runs if run["created_at"] >= created]
+            return runs, "workflow_runs"
+        return None
+
+
+class RateLimit:
+    """Requests left per resource in windows of window seconds, reported like GitHub."""
+
+    def __init__(self, limit, window=60):
+        self.limit = limit
+        self.window = window
+        self._lock = threading.Lock()
+        self._used = {}
+        self._reset = {}
+
+    def take(self, resource):
+        """Spend one request of resource; return (remaining, reset) or None when exhausted."""
+        with self._lock:
+            now = time.time()
+            if self._reset.get(resource, 0) <= now:
+                self._reset[resource] = int(now) + self.window
+                self._used[resource] = 0
+            if self._used[resource] >= self.limit:
+                return None
+            self._used[resource] += 1
+            return self.limit - self._used[resource], self._reset[resource]
+
+
+def make_handler(github, rate_limit, latency):
+    """Request handler class serving github with latency seconds per request."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are written separately, Nagle's algorithm would delay every response
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, payload, headers=()):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _take(self, resource):
+            """Rate limit headers of a request to resource, or None after answering 403 when exhausted."""
+            if latency:
+                time.sleep(latency)
+            budget = rate_limit.take(resource)
+            if budget is None:
+                self._send(403, {"message": "API rate limit exceeded"}, [
+                    ("X-RateLimit-Remaining", "0"), ("X-RateLimit-Resource", resource),
+                    ("X-RateLimit-Reset", str(rate_limit._reset[resource]))])
+                return None
+            return [("X-RateLimit-Limit", str(rate_limit.limit)),
+                    ("X-RateLimit-Remaining", str(budget[0])),
+                    ("X-RateLimit-Reset", str(budget[1])), ("X-RateLimit-Resource", resource)]
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            headers = self._take("graphql")
+            if headers is None:
+                return
+            if self.path != "/graphql":
+                self._send(404, {"message": "Not Found"}, headers)
+                return
+            data = github.graphql(request["query"], request.get("variables") or {})
+            if data is None:
+                self._send(200, {"errors": [{"message": "Unknown query"}]}, headers)
+                return
+            self._send(200, {"data": data}, headers)
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            params = dict(parse_qsl(parts.query))
+            headers = self._take("search" if parts.path.startswith("/search/") else "core")
+            if headers is None:
+                return
+            routed = github.route(parts.path, params)
+            if routed is None:
+                self._send(404, {"message": "Not Found"}, headers)
+                return
+            data, key = routed
+            if isinstance(data, list):
+                data, links = self._page(parts.path, params, data, key)
+                if links:
+                    headers.append(("Link", links))
+            self._send(200, data, headers)
+
+        def _page(self, path, params, items, key):
+            """The requested page of items (wrapped under key) and its Link header."""
+            per_page = int(params.get("per_page", 30))
+            page = int(params.get("page", 1))
+            last = max((len(items) + per_page - 1) // per_page, 1)
+            data = items[(page - 1) * per_page:page * per_page]
+            if key is not None:
+                data = {"total_count": len(items), key: data}
+                if key == "items":
+                    data["incomplete_results"] = False
+
+            def url(number):
+                return f"{github.base_url}{path}?{urlencode(dict(params, page=number))}"
+            links = []
+            if page < last:
+                links.append(f'<{url(page + 1)}>; rel="next"')
+                links.append(f'<{url(last)}>; rel="last"')
+            return data, ", ".join(links)
+
+    return Handler
+
+
+def start_server(rate_limit, latency):
+    """Start the fake GitHub API on a free localhost port; return (server, github)."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), None)
+    server.daemon_threads = True
+    github = FakeGitHub(f"http://127.0.0.1:{server.server_address[1]}")
+    server.RequestHandlerClass = make_handler(github, RateLimit(rate_limit), latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, github
+
+
+def run_pipeline(report_path, profile=False):
+    """Run the pipeline of main.py in this process (configured by the environment) and write its report."""
+    from config import TEAMS
+    from data_collection import collect_github_data, save_collected_data, peak_memory_mb, open_journal
+    from dataset_writer import DatasetWriter
+    from analytics import load_dataframes, calculate_aggregations
+    from generate_web_stats import generate_stats_json, generate_shards
+    from github_api_helpers import scheduler
+    from response_cache import get_cache
+    from run_metrics import metrics
+
+    metrics.profile = profile
+    team = TEAMS[0]
+    writer = DatasetWriter()
+    journal = open_journal()
+    collect_github_data(writer, journal=journal)
+    save_collected_data(writer)
+    journal.finish()
+    with metrics.stage("load"):
+        dataframes = load_dataframes()
+    with metrics.stage("analytics"):
+        results = calculate_aggregations(*dataframes)
+    os.makedirs("web", exist_ok=True)
+    with metrics.stage("web stats"):
+        generate_stats_json(results, team)
+        generate_shards(team, *dataframes)
+    peak = peak_memory_mb()
+    records = sum(results[key] for key in ("total_prs", "total_comments", "total_commits",
+                                           "total_workflow_runs"))
+    metrics.write_report(report_path, scheduler=scheduler, cache=get_cache(),
+                         peak_memory_mb=round(peak, 1) if peak is not None else None,
+                         total_prs=int(results["total_prs"]), records=int(records))
+
+
+def benchmark_size(size, base_url, profile=False, keep=False, backend="rest"):
+    """Run the pipeline for bench-<size> in a fresh process and directory; return its run report."""
+    workdir = tempfile.mkdtemp(prefix=f"wrapped-bench-{size}-")
+    with open(os.path.join(workdir, "teams.json"), "w") as f:
+        json.dump([{"name": size, "org": f"bench-{size}", "members": MEMBERS}], f)
+    env = dict(os.environ, GITHUB_TOKEN="benchmark", GITHUB_API_URL=base_url,
+               TEAMS_FILE="teams.json", DATA_DIR=".", CACHE_PATH=".github_cache.sqlite",
+               COMMIT_STATS_PATH="commit_stats.sqlite", SQL_STORE_PATH="github_data.sqlite",
+               CHECKPOINT_PATH="checkpoints.json", PROFILE_DIR="profiles",
+               JOURNAL_PATH="collection_journal.sqlite", COLLECTION_BACKEND=backend)
+    command = [sys.executable, os.path.abspath(__file__), "--child", "run_report.json"]
+    if profile:
+        command.append("--profile")
+    log_path = os.path.join(workdir, "output.log")
+    start = time.perf_counter()
+    with open(log_path, "w") as log:
+        completed = subprocess.run(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    seconds = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(f"Benchmark of {size} failed, see {log_path}")
+    with open(os.path.join(workdir, "run_report.json")) as f:
+        report = json.load(f)
+    report["process_seconds"] = round(seconds, 3)
+    if keep:
+        report["workdir"] = workdir
+    else:
+        shutil.rmtree(workdir)
+    return report
+
+
+def summarize(size, report, github):
+    """One result row of the benchmark of size from its run report."""
+    stages = {stage["name"]: stage["seconds"] for stage in report["stages"]}
+    collection = sum(stages.get(name, 0) for name in
+                     ("discovery", "pull requests", "pull request activity", "commit stats",
+                      "graphql collection"))
+    wall = report["wall_seconds"]
+    return {
+        "size": size,
+        **SIZES[size],
+        "expected_prs": github.expected_prs(size),
+        "collected_prs": report["total_prs"],
+        "requests": report["requests"],
+        "records": report["records"],
+        "wall_seconds": wall,
+        "collection_seconds": round(collection, 3),
+        "requests_per_second": round(report["requests"] / collection, 1) if collection else None,
+        "records_per_second": round(report["records"] / wall, 1) if wall else None,
+        "peak_memory_mb": report["peak_memory_mb"],
+        "rate_limit_wait_seconds": report.get("rate_limit", {}).get("wait_seconds"),
+        "stages": stages,
+        "workdir": report.get("workdir"),
+    }
+
+
+def print_summary(rows):
+    print(f"\n{'size':<8}{'PRs':>7}{'requests':>10}{'records':>9}{'wall s':>9}"
+          f"{'collect s':>11}{'req/s':>9}{'rec/s':>9}{'peak MB':>9}")
+    for row in rows:
+        print(f"{row['size']:<8}{row['collected_prs']:>7}{row['requests']:>10}{row['records']:>9}"
+              f"{row['wall_seconds']:>9.2f}{row['collection_seconds']:>11.2f}"
+              f"{row['requests_per_second'] or 0:>9.0f}{row['records_per_second'] or 0:>9.0f}"
+              f"{row['peak_memory_mb'] or 0:>9.0f}")
+        if row["collected_prs"] != row["expected_prs"]:
+            print(f"  ⚠️  expected {row['expected_prs']} pull requests in {row['size']}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="benchmark.py",
+                                     description="Benchmark the pipeline against a local fake GitHub API")
+    parser.add_argument("--sizes", type=_sizes, default=list(SIZES),
+                        help=f"comma separated sizes to run (default: {','.join(SIZES)})")
+    parser.add_argument("--latency", type=float, default=0, help="artificial latency of every response, in ms")
+    parser.add_argument("--rate-limit", type=int, default=1000000,
+                        help="requests allowed per resource and minute")
+    parser.add_argument("--graphql", action="store_true",
+                        help="collect with graphql_collector.py instead of the REST API")
+    parser.add_argument("--profile", action="store_true", help="profile every stage with cProfile")
+    parser.add_argument("--keep", action="store_true", help="keep the working directory of each size")
+    parser.add_argument("--output", default=REPORT_PATH, help=f"path of the report (default: {REPORT_PATH})")
+    # Internal: run the pipeline in this process, writing its run report to the given path
+    parser.add_argument("--child", metavar="REPORT", help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.child:
+        run_pipeline(args.child, args.profile)
+        return
+    sizes = args.sizes
+    latency = args.latency / 1000
+    rate_limit = args.rate_limit
+    backend = "graphql" if args.graphql else "rest"
+    server, github = start_server(rate_limit, latency)
+    print(f"🏁 Fake GitHub API at {github.base_url} ({latency * 1000:.0f}ms latency, {backend} backend)")
+
+    rows = []
+    try:
+        for size in sizes:
+            print(f"Benchmarking {size}: {SIZES[size]}...")
+            report = benchmark_size(size, github.base_url, args.profile, args.keep, backend)
+            rows.append(summarize(size, report, github))
+            print(f"✓ {size} took {rows[-1]['wall_seconds']:.1f}s")
+    finally:
+        server.shutdown()
+
+    print_summary(rows)
+    output = args.output
+    with open(output, "w") as f:
+        json.dump({"backend": backend, "latency_ms": latency * 1000, "rate_limit": rate_limit,
+                   "results": rows}, f, indent=2)
+    print(f"\n✓ Saved {output}")
+
+
+if __name__ == "__main__":
+    main()
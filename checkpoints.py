@@ -0,0 +1,55 @@
+"""
+Per-repository high-water marks for incremental data collection
+"""
+import json
+import os
+from config import CHECKPOINT_PATH
+
+
+class CheckpointStore:
+    """JSON file recording, per repository, the newest data already collected.
+
+    Each repository maps to a dict with the newest pull request updated_at,
+    the newest comment updated_at and the highest workflow run id seen. A fresh
+    store ignores the marks on disk, for full collections.
+    """
+
+    def __init__(self, path=CHECKPOINT_PATH, fresh=False):
+        self.path = path
+        self.repos = {}
+        if not fresh and os.path.exists(path):
+            with open(path) as f:
+                self.repos = json.load(f)
+
+    def get(self, repo):
+        """Return the marks for repo, empty if it was never collected."""
+        return self.repos.get(repo, {})
+
+    def advance(self, repo, prs, comments, runs):
+        """Move the marks of repo forward to cover newly collected records."""
+        marks = dict(self.get(repo))
+        _advance(marks, "pr_updated_at", [pr.updated_at for pr in prs])
+        _advance(marks, "comment_updated_at", [c.updated_at for c in comments if c.updated_at])
+        # Runs still in progress must be fetched again later to pick up their conclusion
+        pending = [run.id for run in runs if run.status != "completed"]
+        _advance(marks, "workflow_run_id", [min(pending) - 1] if pending else [run.id for run in runs])
+        self.repos[repo] = marks
+
+    def reset(self, repo, marks):
+        """Put the marks of repo back to marks, e.g. after part of it failed to collect."""
+        if marks:
+            self.repos[repo] = dict(marks)
+        else:
+            self.repos.pop(repo, None)
+
+    def save(self):
+        """Write the marks to disk atomically."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.repos, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def _advance(marks, name, values):
+    if values:
+        marks[name] = max(values + ([marks[name]] if name in marks else []))
@@ -0,0 +1,92 @@
+"""
+Commit statistics stage: additions and deletions per commit sha
+"""
+import sqlite3
+import threading
+from config import COMMIT_STATS_PATH
+from concurrency import run_concurrently
+from github_api_helpers import get_commit_details
+from records import CommitStats
+
+
+class CommitStatsStore:
+    """SQLite table of sha -> (additions, deletions).
+
+    Commits are immutable, so entries never expire. Every result is committed
+    as soon as it is fetched, which lets an interrupted run resume where it
+    stopped.
+    """
+
+    def __init__(self, path=COMMIT_STATS_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS commit_stats ("
+            "sha TEXT PRIMARY KEY, additions INTEGER, deletions INTEGER)"
+        )
+        self._conn.commit()
+
+    def get_many(self, shas):
+        """Return {sha: (additions, deletions)} for the shas already stored."""
+        shas = list(shas)
+        found = {}
+        with self._lock:
+            # Stay below SQLite's limit on query parameters
+            for i in range(0, len(shas), 500):
+                chunk = shas[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT sha, additions, deletions FROM commit_stats "
+                    f"WHERE sha IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update((sha, (additions, deletions)) for sha, additions, deletions in rows)
+        return found
+
+    def put(self, sha, additions, deletions):
+        """Store the stats of one commit."""
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO commit_stats VALUES (?, ?, ?)",
+                               (sha, additions, deletions))
+            self._conn.commit()
+
+
+def parse_commit_url(url):
+    """Split a git commit API url into (owner/repo, sha)."""
+    # .../repos/{owner}/{repo}/git/commits/{sha}
+    path = url.split("/repos/", 1)[1].split("/")
+    return f"{path[0]}/{path[1]}", path[-1]
+
+
+def collect_commit_stats(commit_urls, store=None, journal=None):
+    """Return the CommitStats records of the unique commits in commit_urls.
+
+    Shas found in store are not fetched again, the rest are fetched in parallel
+    and written to store as they complete. With a job journal failing fetches
+    are retried and recorded as its units. Commits whose stats could not be
+    fetched are reported and left out.
+    """
+    store = store or CommitStatsStore()
+    repos_by_sha = {}
+    for url in commit_urls:
+        repo, sha = parse_commit_url(url)
+        repos_by_sha.setdefault(sha, repo)
+
+    known = store.get_many(repos_by_sha)
+    missing = [(repo, sha) for sha, repo in repos_by_sha.items() if sha not in known]
+    print(f"{len(repos_by_sha)} unique commits, {len(known)} already known, fetching {len(missing)}")
+
+    def fetch(item):
+        repo, sha = item
+        stats = get_commit_details(repo, sha)["stats"]
+        store.put(sha, stats["additions"], stats["deletions"])
+        return stats["additions"], stats["deletions"]
+
+    if journal is not None:
+        fetch_once = fetch
+
+        def fetch(item):
+            return journal.attempt(f"commit stats {item[1]}", fetch_once, item)
+
+    fetched = run_concurrently(fetch, missing, lambda item: item[1][:7])
+    known.update((sha, stats) for (_, sha), stats in zip(missing, fetched) if stats is not None)
+
+    return [CommitStats(sha, *known[sha]) for sha in repos_by_sha if sha in known]
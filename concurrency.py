@@ -0,0 +1,44 @@
+"""
+Thread pool helpers shared by the collection stages
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+from config import MAX_WORKERS
+from run_metrics import metrics
+
+
+def iter_concurrently(func, items, describe, max_workers=MAX_WORKERS):
+    """Run func over items on a thread pool and yield (item, result) in input order.
+
+    At most a few times max_workers items are in flight, so results are
+    streamed to the caller instead of piling up. Items that raise are reported
+    and yield None, so one failing repository or pull request does not abort
+    the whole collection.
+    """
+    items = list(items)
+    func = metrics.profiled(func)
+    window = max_workers * 4
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        next_index = 0
+        t = tqdm(total=len(items), leave=True, bar_format="{desc} {n_fmt}/{total_fmt}")
+        while next_index < len(items) or pending:
+            while next_index < len(items) and len(pending) < window:
+                pending.append((items[next_index], executor.submit(func, items[next_index])))
+                next_index += 1
+            item, future = pending.popleft()
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Error processing {describe(item)}: {e}")
+                result = None
+            t.set_description("%s" % describe(item))
+            t.update()
+            yield item, result
+        t.close()
+
+
+def run_concurrently(func, items, describe, max_workers=MAX_WORKERS):
+    """Run func over items on a thread pool and return results in input order."""
+    return [result for _, result in iter_concurrently(func, items, describe, max_workers)]
@@ -1,17 +1,25 @@
 """
 Configuration file for GitHub Team Wrapped
 """
+import json
 import os
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Get GitHub token from environment variable
+# Get GitHub token from environment variable, only needed by the stages that call the API
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN", "")
 
-if not GITHUB_TOKEN:
-    raise ValueError("GITHUB_TOKEN not found. Please create a .env file with your token.")
+
+def require_token():
+    """Raise when no GitHub token is configured (offline stages work without one)."""
+    if not GITHUB_TOKEN:
+        raise ValueError("GITHUB_TOKEN not found. Please create a .env file with your token.")
+
+
+# Base url of the GitHub REST API, override to target GitHub Enterprise or a local fake server
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")
 
 HEADERS = {
     "Authorization": f"Bearer {GITHUB_TOKEN}",
@@ -23,5 +31,84 @@ TEAM_MEMBERS = ["mitanuriel", "TheoKoppenhoefer","lucalewin","V4ldeSalnikov", "G
 
 ORG_NAME = "Kravi-Analytics-AB"  
 
+# Teams to collect in one run. TEAMS_FILE is a JSON list of {"name", "org", "members"} objects;
+# without it the single team above is used. Teams share one collection, each org is crawled once.
+TEAMS_FILE = os.getenv("TEAMS_FILE", "teams.json")
+if os.path.exists(TEAMS_FILE):
+    with open(TEAMS_FILE) as f:
+        TEAMS = json.load(f)
+else:
+    TEAMS = [{"name": "default", "org": ORG_NAME, "members": TEAM_MEMBERS}]
+
 # Collecting data from January 1, 2025 to present (January 15, 2026) - over 1 year of history
 SINCE_DATE = "2025-01-01T00:00:00Z"
+
+# Number of worker threads used to fetch repositories and pull requests concurrently
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "8"))
+
+# Pages of a long listing fetched ahead of the one being read (by a pool of MAX_WORKERS threads)
+PREFETCH_PAGES = int(os.getenv("PREFETCH_PAGES", "4"))
+
+# Seconds to wait for a connection and for a response, and retries on network or 5xx errors
+REQUEST_TIMEOUT = (float(os.getenv("CONNECT_TIMEOUT", "10")), float(os.getenv("READ_TIMEOUT", "60")))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+
+# Format of the collected tables: "parquet" (needs pyarrow), "csv", or "auto" to use parquet when available
+STORAGE_FORMAT = os.getenv("STORAGE_FORMAT", "auto")
+DATA_DIR = os.getenv("DATA_DIR", ".")
+
+# Records buffered per table before they are appended to the CSV files
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
+
+# On-disk cache of API responses, set CACHE_PATH to an empty string to disable it
+CACHE_PATH = os.getenv("CACHE_PATH", ".github_cache.sqlite")
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_MB", "512")) * 1024 * 1024
+
+# How pull requests, comments and commits are collected: "rest" or "graphql" (fewer, batched calls)
+COLLECTION_BACKEND = os.getenv("COLLECTION_BACKEND", "rest")
+
+# How repositories without team pull requests are skipped before collection: "search" (search API,
+# one query per member), "pushed" (repos not pushed to since SINCE_DATE) or "none" (collect every repo)
+REPO_DISCOVERY = os.getenv("REPO_DISCOVERY", "search")
+
+# Permanent store of additions/deletions per commit sha
+COMMIT_STATS_PATH = os.getenv("COMMIT_STATS_PATH", "commit_stats.sqlite")
+
+# SQLite copy of the collected tables for SQL queries (python sql_store.py), empty to disable it
+SQL_STORE_PATH = os.getenv("SQL_STORE_PATH", "github_data.sqlite")
+
+# JSON report of the stage timings and API requests of each run, and where --profile saves profiles
+RUN_REPORT_PATH = os.getenv("RUN_REPORT_PATH", "run_report.json")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# Journal of the collection units completed by an unfinished run, resumed by the next run with the
+# same settings within JOURNAL_MAX_AGE_HOURS (empty to disable), and retries of a failing unit
+# with exponential backoff starting at JOB_BACKOFF seconds
+JOURNAL_PATH = os.getenv("JOURNAL_PATH", "collection_journal.sqlite")
+JOURNAL_MAX_AGE = float(os.getenv("JOURNAL_MAX_AGE_HOURS", "24")) * 3600
+JOB_RETRIES = int(os.getenv("JOB_RETRIES", "3"))
+JOB_BACKOFF = float(os.getenv("JOB_BACKOFF", "2"))
+
+# Keys of the update_and_deploy.py stages of the last run, unchanged stages are skipped
+PIPELINE_STATE_PATH = os.getenv("PIPELINE_STATE_PATH", "pipeline_state.json")
+
+# Content fingerprints of the stored tables, see fingerprints.py
+FINGERPRINTS_PATH = os.getenv("FINGERPRINTS_PATH", "fingerprints.json")
+
+# Local socket of the stats daemon (python wrapped.py serve)
+DAEMON_SOCKET = os.getenv("DAEMON_SOCKET", ".wrapped.sock")
+
+# Webhook ingestion (python wrapped.py ingest): address of the local endpoint, secret the deliveries
+# are signed with (checked when set), recording of the received events (empty to disable), seconds
+# events are batched before they are written, and hours between reconciliations with an incremental
+# collection (0 to disable)
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8000"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_LOG_PATH = os.getenv("WEBHOOK_LOG_PATH", "webhook_events.jsonl")
+WEBHOOK_STATE_PATH = os.getenv("WEBHOOK_STATE_PATH", "webhook_state.json")
+WEBHOOK_BATCH_SECONDS = float(os.getenv("WEBHOOK_BATCH_SECONDS", "5"))
+WEBHOOK_RECONCILE_HOURS = float(os.getenv("WEBHOOK_RECONCILE_HOURS", "24"))
+
+# Per-repository high-water marks used by incremental collection (--incremental)
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "checkpoints.json")
@@ -0,0 +1,3 @@
+"""
+Makes the top level modules importable from tests/ however pytest is started
+"""
@@ -1,159 +1,273 @@
 """
 Script to collect data from GitHub API
 """
-import time
-import pandas as pd
-from tqdm import tqdm
-from config import ORG_NAME, TEAM_MEMBERS, SINCE_DATE
+import sys
+from config import SINCE_DATE, COLLECTION_BACKEND, GITHUB_API_URL, TEAMS, JOURNAL_PATH
 from github_api_helpers import (
     fetch_org_repos,
     fetch_prs,
     fetch_comments_url,
     filter_prs_by_date,
     filter_prs_by_collaboarators,
-    get_commit_details,
     fetch_workflow_runs,
-    fetch_workflows
+    fetch_workflows,
+    scheduler
 )
+from response_cache import get_cache
+from checkpoints import CheckpointStore
+from job_journal import JobJournal, is_retryable
+from commit_stats import collect_commit_stats
+from concurrency import iter_concurrently
+from dataset_writer import DatasetWriter
+from storage import read_table
+from run_metrics import metrics
+from rollups import update_rollups
+from sql_store import update_sql_store
+from fingerprints import table_fingerprints
+from teams import members_by_org
+from discovery import discover_relevant_repos
+from records import COLUMNS, COLLECTED_TABLES, as_records, project_repo, project_pr, project_comment, project_commit, project_run
 
 
-def collect_github_data():
-    """Main function to collect all GitHub data."""
-    print("Fetching organization repositories...")
-    org_repos = fetch_org_repos(ORG_NAME)
-    print(f"Found {len(org_repos)} repositories in the organization.")
+def collect_repo_prs(repo, marks=None, members=()):
+    """Fetch the pull requests of members and the workflow runs for a single repository.
+
+    marks are the repository's incremental checkpoints; when given only pull
+    requests and workflow runs newer than them are fetched. Returns the team's
+    pull requests, the workflow runs and every pull request that was fetched,
+    all projected to records.
+    """
+    marks = marks or {}
+    fetched_prs = fetch_prs(repo["full_name"], updated_since=marks.get("pr_updated_at"))
+    prs = fetched_prs
+    # Filter out pull requests by SINCE_DATE
+    # comment out to get the full repo history
+    prs = filter_prs_by_date(prs)
+
+    # Filter out by collaborators
+    # comment out to get PRs from all collaborators
+    prs = filter_prs_by_collaboarators(prs, members)
+
+    # Fetch workflow runs for this repo
+    runs = []
+    try:
+        runs = fetch_workflow_runs(repo["full_name"], after_id=marks.get("workflow_run_id"))
+    except Exception as e:
+        # Network errors fail the whole repository, so it is retried rather than saved without runs
+        if is_retryable(e):
+            raise
+        print(f"\nNote: Could not fetch workflows for {repo['full_name']}: {e}")
+    return ([project_pr(pr) for pr in prs], [project_run(run) for run in runs],
+            [project_pr(pr) for pr in fetched_prs])
+
+
+def collect_pr_activity(pr, comments_since=SINCE_DATE):
+    """Fetch the review comments, issue comments and commits of a single pull request record."""
+    pr_url = f"{GITHUB_API_URL}/repos/{pr.repo_full_name}"
+    pull_comments = fetch_comments_url(f"{pr_url}/pulls/{pr.number}/comments", since=comments_since)
+    issue_comments = fetch_comments_url(f"{pr_url}/issues/{pr.number}/comments", since=comments_since)
+    commits = fetch_comments_url(f"{pr_url}/pulls/{pr.number}/commits")
+    return ([project_comment(comment, pr.id) for comment in pull_comments + issue_comments],
+            [project_commit(commit, pr.id) for commit in commits])
+
+
+def fetch_all_org_repos(org_members):
+    """Fetch the repositories of every organization once, tagging each with its "org"."""
+    org_repos = {}
+    for org in org_members:
+        print(f"Fetching repositories of {org}...")
+        repos = fetch_org_repos(org)
+        print(f"Found {len(repos)} repositories in {org}.")
+        for repo in repos:
+            org_repos.setdefault(repo["full_name"], dict(repo, org=org))
+    return list(org_repos.values())
+
+
+def open_journal(backend=COLLECTION_BACKEND, incremental=False, teams=TEAMS, path=JOURNAL_PATH):
+    """Open the job journal of a run, resuming it when the last run with the same settings did not finish."""
+    settings = {"backend": backend, "incremental": incremental, "since": SINCE_DATE, "teams": teams}
+    return JobJournal(path, settings)
+
+
+def collect_github_data(writer, checkpoints=None, backend=COLLECTION_BACKEND, teams=TEAMS, journal=None):
+    """Main function to collect all GitHub data.
+
+    Records are streamed to writer (a DatasetWriter) as each repository and
+    pull request completes; the caller closes it. With a CheckpointStore only
+    data newer than its per-repository marks is collected, and the marks are
+    advanced in memory; the caller saves them once the writer is closed.
+    backend "graphql" collects through graphql_collector instead of the REST API.
+
+    Every repository, pull request and commit is a unit of journal (see
+    job_journal.py): failing units are retried, and the results of units
+    completed by an interrupted run are replayed instead of fetched again.
+    Without a journal units are only retried.
+
+    Each organization of teams is crawled once for the members of all its
+    teams, sharing the rate limit budget, connection pool and cache. Repositories
+    without team pull requests are skipped (see discovery.py), along with their
+    workflow runs.
+    """
+    journal = journal or JobJournal(path="")
+    if backend == "graphql":
+        from graphql_collector import collect_github_data_graphql
+        return collect_github_data_graphql(writer, checkpoints, teams=teams, journal=journal)
+
+    org_members = members_by_org(teams)
+    with metrics.stage("discovery"):
+        org_repos = discover_relevant_repos(fetch_all_org_repos(org_members), org_members)
 
     print("Identifying repositories with contributions from team members...")
-    relevant_repos = []
+    # Marks as they were before this run, advancing them must not narrow the fetches below
+    marks = {repo["full_name"]: dict(checkpoints.get(repo["full_name"])) if checkpoints is not None else {}
+             for repo in org_repos}
     relevant_prs = []
-    relevant_prs_comments = []
-    relevant_prs_commits = []
-    commits_stats = []
-    workflow_runs = []
-    
-    t = tqdm(org_repos, leave=True, bar_format="{desc} {n_fmt}/{total_fmt}")
-
-    for repo in t:
-        t.set_description("%s" % repo["full_name"])
-        t.refresh()
-        try:
-            prs = fetch_prs(repo["full_name"])
-            # Filter out pull requests by SINCE_DATE
-            # comment out to get the full repo history
-            prs = filter_prs_by_date(prs)
-
-            # Filter out by collaborators
-            # comment out to get PRs from all collaborators
-            prs = filter_prs_by_collaboarators(prs, TEAM_MEMBERS)
-
-            # Fetch the comments if there are any
-            for pr in prs:
-                pull_comments = fetch_comments_url(pr["review_comments_url"])
-                issue_comments = fetch_comments_url(pr["comments_url"])
-                commits = [commit["commit"]
-                           for commit in fetch_comments_url(pr["commits_url"])]
-                relevant_prs_comments.extend(pull_comments)
-                relevant_prs_comments.extend(issue_comments)
-                relevant_prs_commits.extend(commits)
-            
-            # Fetch workflow runs for this repo
-            try:
-                runs = fetch_workflow_runs(repo["full_name"])
-                workflow_runs.extend(runs)
-            except Exception as e:
-                print(f"\nNote: Could not fetch workflows for {repo['full_name']}: {e}")
-            
+
+    def collect(repo):
+        return journal.run(f"repo {repo['full_name']}", collect_repo_prs,
+                           repo, marks[repo["full_name"]], org_members[repo["org"]])
+
+    with metrics.stage("pull requests"):
+        for repo, result in iter_concurrently(collect, org_repos, lambda repo: repo["full_name"]):
+            if result is None:
+                continue
+            # Results replayed from the journal hold lists of column values
+            prs, runs, fetched_prs = result
+            prs, runs = as_records("relevant_prs", prs), as_records("workflow_runs", runs)
+            fetched_prs = as_records("relevant_prs", fetched_prs)
+            writer.write("workflow_runs", runs)
+            if checkpoints is not None:
+                checkpoints.advance(repo["full_name"], fetched_prs, [], runs)
             if len(prs) > 0:
-                time.sleep(30)
-                relevant_repos.append(repo)
+                writer.write("relevant_repos", [project_repo(repo)])
+                writer.write("relevant_prs", prs)
                 relevant_prs.extend(prs)
-        except Exception as e:
-            print(f"Error processing {repo['full_name']}: {e}")
-            # Timeout in case of hitting Github API rate limit
-            # t.set_description("%s Exception, sleeping 1 minute" % e)
-            # t.refresh()
-            # time.sleep(60)
+
+    print("\nFetching comments and commits of team pull requests...")
+    commit_urls = []
+    failed_repos = set()
+    with metrics.stage("pull request activity"):
+        pr_results = iter_concurrently(
+            lambda pr: journal.run(f"pr {pr.html_url}", collect_pr_activity,
+                                   pr, marks[pr.repo_full_name].get("comment_updated_at", SINCE_DATE)),
+            relevant_prs, lambda pr: pr.html_url)
+        for pr, result in pr_results:
+            if result is None:
+                failed_repos.add(pr.repo_full_name)
+                continue
+            comments, commits = result
+            comments = as_records("relevant_prs_comments", comments)
+            commits = as_records("relevant_prs_commits", commits)
+            writer.write("relevant_prs_comments", comments)
+            writer.write("relevant_prs_commits", commits)
+            commit_urls.extend(commit.url for commit in commits)
+            if checkpoints is not None:
+                checkpoints.advance(pr.repo_full_name, [], comments, [])
+
+    if checkpoints is not None:
+        # Leave the marks alone so the failed pull requests are fetched again next run
+        for repo_name in failed_repos:
+            checkpoints.reset(repo_name, marks[repo_name])
 
     print("\nCollecting commit statistics (this may take a while)...")
     print("Note: This step can be skipped for optimization.")
     
     # Optional: Collect detailed commit stats
-    # Comment out the following block to skip this step
-    for commit in tqdm(relevant_prs_commits):
-        try:
-            repo = commit["url"].split("/")[4] + "/" + commit["url"].split("/")[5]
-            sha = commit["url"].split("/")[8]
-            stats = get_commit_details(repo, sha)["stats"]
-            commits_stats.append({
-                "sha": sha, 
-                "additions": stats["additions"], 
-                "deletions": stats["deletions"]
-            })
-        except Exception as e:
-            print(f"Error collecting stats for commit {sha}: {e}")
-
-    return relevant_repos, relevant_prs, relevant_prs_comments, relevant_prs_commits, commits_stats, workflow_runs
-
-
-def create_dataframes(relevant_repos, relevant_prs, relevant_prs_comments, 
-                      relevant_prs_commits, commits_stats, workflow_runs):
-    """Create and save pandas dataframes from collected data."""
+    # Comment out the following line to skip this step
+    with metrics.stage("commit stats"):
+        writer.write("commits_stats", collect_commit_stats(commit_urls, journal=journal))
+
+    print(f"\nRate limit: waited {scheduler.wait_time:.0f}s, retried {scheduler.retries} requests")
+    if get_cache() is not None:
+        print(get_cache().summary())
+
+
+
+def create_dataframes(relevant_repos, relevant_prs, relevant_prs_comments,
+                      relevant_prs_commits, commits_stats, workflow_runs, merge=False):
+    """Save lists of collected records as tables and return them as dataframes.
+
+    The records are those built by records.py. With merge the data is added to
+    the previously saved tables, as done by incremental collection.
+    """
     print("\nCreating dataframes...")
-    
-    # Repos dataframe
-    repos_df = pd.DataFrame.from_dict(relevant_repos)
-    repos_df.to_csv("relevant_repos.csv", index=False)
-    print("✓ Saved relevant_repos.csv")
-
-    # PRs dataframe
-    prs_df = pd.DataFrame.from_dict(relevant_prs)
-    if not prs_df.empty:
-        prs_df["user_login"] = prs_df["user"].apply(lambda d: d.get("login"))
-        prs_df["created_at"] = pd.to_datetime(prs_df["created_at"], utc=True)
-        prs_df["repo_name"] = prs_df["url"].apply(lambda d: d.split("/")[5])
-    prs_df.to_csv("relevant_prs.csv", index=False)
-    print("✓ Saved relevant_prs.csv")
-
-    # Comments dataframe
-    comments_df = pd.DataFrame.from_dict(relevant_prs_comments)
-    if not comments_df.empty:
-        comments_df["user_login"] = comments_df["user"].apply(lambda d: d.get("login"))
-        comments_df["repo_name"] = comments_df["html_url"].apply(lambda d: d.split("/")[4])
-    comments_df.to_csv("relevant_prs_comments.csv", index=False)
-    print("✓ Saved relevant_prs_comments.csv")
-
-    # Commits dataframe
-    commits_df = pd.DataFrame.from_dict(relevant_prs_commits)
-    if not commits_df.empty:
-        commits_df["user_login"] = commits_df["committer"].apply(lambda d: d.get("login") if d else None)
-        commits_df["repo_name"] = commits_df["url"].apply(lambda d: d.split("/")[5])
-    commits_df.to_csv("relevant_prs_commits.csv", index=False)
-    print("✓ Saved relevant_prs_commits.csv")
-
-    # Commit stats dataframe
-    commits_stats_df = pd.DataFrame.from_dict(commits_stats)
-    commits_stats_df.to_csv("commits_stats.csv", index=False)
-    print("✓ Saved commits_stats.csv")
-
-    # Workflow runs dataframe
-    workflow_runs_df = pd.DataFrame.from_dict(workflow_runs)
-    if not workflow_runs_df.empty:
-        workflow_runs_df["created_at"] = pd.to_datetime(workflow_runs_df["created_at"], utc=True)
-        workflow_runs_df["repo_name"] = workflow_runs_df["repository"].apply(lambda d: d.get("full_name") if d else None)
-    workflow_runs_df.to_csv("workflow_runs.csv", index=False)
-    print("✓ Saved workflow_runs.csv")
-
-    return repos_df, prs_df, comments_df, commits_df, commits_stats_df, workflow_runs_df
+    writer = DatasetWriter(merge=merge)
+    tables = (relevant_repos, relevant_prs, relevant_prs_comments,
+              relevant_prs_commits, commits_stats, workflow_runs)
+    for table, records in zip(COLLECTED_TABLES, tables):
+        writer.write(table, records)
+    writer.close()
+    update_rollups(writer.storage)
+    update_sql_store(writer.storage)
+    return tuple(read_table(table) for table in COLLECTED_TABLES)
 
 
-if __name__ == "__main__":
-    # Collect data
-    relevant_repos, relevant_prs, relevant_prs_comments, relevant_prs_commits, commits_stats, workflow_runs = collect_github_data()
-    
-    # Create dataframes
-    repos_df, prs_df, comments_df, commits_df, commits_stats_df, workflow_runs_df = create_dataframes(
-        relevant_repos, relevant_prs, relevant_prs_comments, 
-        relevant_prs_commits, commits_stats, workflow_runs
-    )
-    
+def peak_memory_mb():
+    """Peak resident memory of this process in MB, or None where it is unavailable."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def save_collected_data(writer, checkpoints=None):
+    """Publish the collected tables and checkpoints, then build the rollup, SQL store and table fingerprints."""
+    with metrics.stage("save"):
+        writer.close()
+        if checkpoints is not None:
+            checkpoints.save()
+    with metrics.stage("rollups"):
+        update_rollups(writer.storage)
+    with metrics.stage("sql store"):
+        update_sql_store(writer.storage)
+    with metrics.stage("fingerprints"):
+        table_fingerprints(writer.storage, COLUMNS)
+
+
+def write_run_report(journal=None):
+    """Print the stage timings and write the run report (see run_metrics.py) with journal's failed units."""
+    print("\nStage timings:")
+    metrics.print_stages()
+    peak = peak_memory_mb()
+    metrics.write_report(scheduler=scheduler, cache=get_cache(),
+                         peak_memory_mb=round(peak, 1) if peak is not None else None,
+                         failed_units=journal.failures() if journal is not None else {})
+
+
+def run_collection(incremental=False, backend=COLLECTION_BACKEND):
+    """Collect the data and save the tables, rollup and SQL store; return the run's job journal.
+
+    With incremental only data newer than the checkpoints is fetched and
+    merged into the saved tables.
+    """
+    checkpoints = CheckpointStore(fresh=not incremental)
+    journal = open_journal(backend, incremental)
+
+    # Collect data, streaming it to the table files
+    writer = DatasetWriter(merge=incremental)
+    collect_github_data(writer, checkpoints, backend, journal=journal)
+
+    print("\nSaving data...")
+    save_collected_data(writer, checkpoints)
+    journal.finish()
+    return journal
+
+
+def main(incremental=False, backend=COLLECTION_BACKEND):
+    """Collect the data, then print the peak memory and write the run report."""
+    journal = run_collection(incremental, backend)
+
+    if peak_memory_mb() is not None:
+        print(f"\nPeak memory: {peak_memory_mb():.0f} MB")
+    write_run_report(journal)
     print("\n✅ Data collection complete!")
+
+
+if __name__ == "__main__":
+    # --profile runs every stage under cProfile
+    metrics.profile = "--profile" in sys.argv
+    # --incremental only fetches data newer than the last run and merges it into the tables
+    main("--incremental" in sys.argv, "graphql" if "--graphql" in sys.argv else COLLECTION_BACKEND)
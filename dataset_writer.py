@@ -0,0 +1,59 @@
+"""
+Chunked, streaming writer for the collected tables
+"""
+import os
+from config import CHUNK_SIZE
+from records import COLLECTED_TABLES
+from storage import get_storage, merge_tables
+
+
+class DatasetWriter:
+    """Append projected records to one file per table as they are collected.
+
+    Records are buffered per table and flushed every chunk_size rows to a
+    .partial file of the storage backend, so memory stays bounded whatever the
+    size of the org. close() moves the partial files into place, or merges them
+    into the existing tables (deduplicated by key) when merge is set.
+    """
+
+    def __init__(self, storage=None, chunk_size=CHUNK_SIZE, merge=False):
+        self.storage = storage or get_storage()
+        self.chunk_size = chunk_size
+        self.merge = merge
+        self.counts = dict.fromkeys(COLLECTED_TABLES, 0)
+        self._buffers = {table: [] for table in COLLECTED_TABLES}
+        self._writers = {}
+
+    def partial_path(self, table):
+        """Path the records of table are streamed to before close()."""
+        return self.storage.path(table) + ".partial"
+
+    def write(self, table, records):
+        """Queue records for table, flushing a chunk once enough are buffered."""
+        buffer = self._buffers[table]
+        buffer.extend(records)
+        if len(buffer) >= self.chunk_size:
+            self.flush(table)
+
+    def flush(self, table):
+        """Append the buffered records of table to its partial file."""
+        if table not in self._writers:
+            self._writers[table] = self.storage.chunk_writer(self.partial_path(table), table)
+        if self._buffers[table]:
+            self._writers[table].write(self._buffers[table])
+        self.counts[table] += len(self._buffers[table])
+        self._buffers[table].clear()
+
+    def close(self):
+        """Flush every table and publish the partial files."""
+        for table in COLLECTED_TABLES:
+            self.flush(table)
+            self._writers.pop(table).close()
+            partial_path = self.partial_path(table)
+            if self.merge and self.storage.exists(table):
+                new_df = self.storage.read_path(partial_path, table)
+                self.storage.write(table, merge_tables(self.storage, table, new_df))
+                os.remove(partial_path)
+            else:
+                os.replace(partial_path, self.storage.path(table))
+            print(f"✓ Saved {self.storage.path(table)}")
@@ -0,0 +1,57 @@
+"""
+Discovery of the repositories worth collecting
+
+Most repositories of an organization have no pull requests by the team in
+the collected period. Finding the ones that do before any per-repository
+pagination means the others cost no API calls at all.
+"""
+from config import SINCE_DATE, REPO_DISCOVERY
+from github_api_helpers import search_pr_repos
+
+
+def pushed_since(repo, since=SINCE_DATE):
+    """Whether repo has been pushed to since since (a repo without pushes can't have new pull requests)."""
+    return repo.get("pushed_at") is not None and repo["pushed_at"] >= since
+
+
+def search_relevant_repos(org, members, since=SINCE_DATE):
+    """Return the full names of org's repositories with pull requests by members since since.
+
+    One search query is made per member. Returns None when a search can't be
+    relied on (too many results), in which case the caller falls back to
+    pushed_at pruning.
+    """
+    relevant = set()
+    for member in sorted(members):
+        repos = search_pr_repos(org, member, since)
+        if repos is None:
+            print(f"Note: Too many search results for {member} in {org}, using pushed_at pruning")
+            return None
+        relevant.update(repos)
+    return relevant
+
+
+def discover_relevant_repos(org_repos, org_members, mode=REPO_DISCOVERY):
+    """Keep the repositories of org_repos that can contain team pull requests.
+
+    org_repos are tagged with their "org" (see data_collection.fetch_all_org_repos)
+    and org_members maps each org to its members. mode is "search" (search API,
+    falling back to "pushed"), "pushed" (drop repos not pushed to since
+    SINCE_DATE) or "none" (keep every repo).
+    """
+    if mode == "none":
+        return org_repos
+    if mode not in ("search", "pushed"):
+        raise ValueError(f"Unknown REPO_DISCOVERY: {mode}")
+
+    relevant_names = {}
+    for org, members in org_members.items():
+        relevant_names[org] = search_relevant_repos(org, members) if mode == "search" else None
+
+    relevant = []
+    for repo in org_repos:
+        names = relevant_names[repo["org"]]
+        if (repo["full_name"] in names) if names is not None else pushed_since(repo):
+            relevant.append(repo)
+    print(f"{len(relevant)} of {len(org_repos)} repositories may contain team pull requests.")
+    return relevant
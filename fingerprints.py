@@ -0,0 +1,128 @@
+"""
+Content fingerprints of the collected tables and the web artifacts
+
+A table's fingerprint hashes its rows regardless of their order or of the
+storage format, so a collection that brings nothing new leaves it unchanged
+even when the file is rewritten. Fingerprints are kept in FINGERPRINTS_PATH
+with the size and modification time of the file they were computed from, and
+recomputed when the file changes. Artifacts (stats files, shards and their
+copies in docs/) are only written when their content differs, so unchanged
+ones keep their timestamps and never show up in a commit.
+"""
+import hashlib
+import json
+import os
+import shutil
+import pandas as pd
+from config import FINGERPRINTS_PATH
+from records import COLUMNS
+
+
+def _content_hash(storage, table):
+    """Order insensitive hash of the rows of the stored table."""
+    total = 0
+    rows = 0
+    for chunk in storage.read_chunks(table):
+        # Row hashes are summed (modulo 2**64) so the order of the rows doesn't matter
+        total = (total + int(pd.util.hash_pandas_object(chunk, index=False).to_numpy().sum())) % 2 ** 64
+        rows += len(chunk)
+    payload = json.dumps([COLUMNS[table], rows, total])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _load(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+def _save(fingerprints, path):
+    if not path:
+        return
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(fingerprints, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def table_fingerprints(storage, tables, path=FINGERPRINTS_PATH):
+    """Return {table: fingerprint} of tables (None for tables not stored), recomputing stale ones."""
+    fingerprints = _load(path)
+    result = {}
+    changed = False
+    for table in tables:
+        if not storage.exists(table):
+            result[table] = None
+            continue
+        stat = os.stat(storage.path(table))
+        entry = fingerprints.get(storage.path(table))
+        if entry is None or entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime:
+            entry = {"hash": _content_hash(storage, table), "size": stat.st_size, "mtime": stat.st_mtime}
+            fingerprints[storage.path(table)] = entry
+            changed = True
+        result[table] = entry["hash"]
+    if changed:
+        _save(fingerprints, path)
+    return result
+
+
+def file_hash(path):
+    """sha256 of the file at path, or None when it doesn't exist."""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_if_changed(path, content):
+    """Write content (str) to path unless the file already holds it; return whether it was written."""
+    data = content.encode()
+    if file_hash(path) == hashlib.sha256(data).hexdigest():
+        return False
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+
+def remove_stale(directory, keep):
+    """Remove the files under directory whose paths are not in keep; return the removed paths."""
+    removed = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            if path not in keep:
+                os.remove(path)
+                removed.append(path)
+    return removed
+
+
+def sync(source, target):
+    """Make target a copy of source (a file or a directory), only writing the files that differ.
+
+    Files of a target directory missing from source are removed. Returns the
+    target paths that were written or removed.
+    """
+    if os.path.isfile(source):
+        if file_hash(source) == file_hash(target):
+            return []
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+        shutil.copyfile(source, target)
+        return [target]
+    changed = []
+    copied = set()
+    for root, _, files in os.walk(source):
+        for name in files:
+            path = os.path.join(root, name)
+            copy = os.path.join(target, os.path.relpath(path, source))
+            copied.add(copy)
+            changed.extend(sync(path, copy))
+    if os.path.isdir(target):
+        changed.extend(remove_stale(target, copied))
+    return changed
@@ -2,91 +2,71 @@
 Script to generate stats.json for the web interface
 """
 import json
-import pandas as pd
-from config import TEAM_MEMBERS
+import os
+from config import TEAMS
+from analytics import load_dataframes, calculate_aggregations
+from fingerprints import write_if_changed, remove_stale
+from teams import team_dataframes, stats_filename, shards_dirname, slug
 
-def generate_stats_json():
-    """Generate stats.json file for the web interface"""
-    
-    print("Generating stats.json for web interface...")
+# Index of the stats file and shards directory of every team, read by web/script.js
+TEAM_FILES = "team-files.json"
+
+def build_web_stats(results, team_size=None):
+    """Shape the results of analytics.calculate_aggregations for the web interface."""
+    if team_size is None:
+        team_size = len(TEAMS[0]["members"])
+    busiest_month, busiest_month_prs = results["top_month"]
+    most_active_repo, most_active_repo_prs = results["most_active_repo"]
+    return {
+        "team_size": team_size,
+        "repo_count": results["total_repos"],
+        "total_prs": results["total_prs"],
+        "total_additions": results["total_additions"] if isinstance(results["total_additions"], int) else 0,
+        "total_deletions": results["total_deletions"] if isinstance(results["total_deletions"], int) else 0,
+        "total_commits": results["total_commits"],
+        "total_comments": results["total_comments"],
+        "busiest_month": busiest_month or "N/A",
+        "busiest_month_prs": busiest_month_prs,
+        "most_active_repo": most_active_repo or "N/A",
+        "most_active_repo_prs": most_active_repo_prs,
+        "total_workflow_runs": results["total_workflow_runs"],
+        "successful_workflow_runs": results["successful_workflow_runs"],
+        "failed_workflow_runs": results["failed_workflow_runs"]
+    }
+
+
+def _write_json(path, data):
+    """Write data as JSON to path unless it already holds it; return whether it was written."""
+    return write_if_changed(path, json.dumps(data, indent=2))
+
+
+def generate_stats_json(results=None, team=None):
+    """Generate the stats file of team (default: the first team) for the web interface
+
+    results are those of analytics.calculate_aggregations for the team; when
+    not given the data is loaded and aggregated here. The first team is written
+    to web/stats.json, the others to web/stats-<name>.json.
+    """
+    team = team or TEAMS[0]
+    path = os.path.join("web", stats_filename(team))
+    print(f"Generating {path} for web interface...")
     
-    # Load data
-    try:
-        repos_df = pd.read_csv("relevant_repos.csv")
-        prs_df = pd.read_csv("relevant_prs.csv")
-        if not prs_df.empty:
-            prs_df["created_at"] = pd.to_datetime(prs_df["created_at"], utc=True)
-        comments_df = pd.read_csv("relevant_prs_comments.csv")
-        commits_df = pd.read_csv("relevant_prs_commits.csv")
-        commits_stats_df = pd.read_csv("commits_stats.csv")
-        
-        # Load workflow runs (may not exist in older data)
+    if results is None:
         try:
-            workflow_runs_df = pd.read_csv("workflow_runs.csv")
-            if not workflow_runs_df.empty:
-                workflow_runs_df["created_at"] = pd.to_datetime(workflow_runs_df["created_at"], utc=True)
-        except FileNotFoundError:
-            workflow_runs_df = pd.DataFrame()
-            print("Note: workflow_runs.csv not found. Skipping workflow stats.")
-    except FileNotFoundError as e:
-        print(f"Error: CSV files not found. Please run data collection first.")
-        print(f"Missing file: {e}")
-        return
-    
-    # Calculate stats
-    total_prs = len(prs_df)
-    total_commits = len(commits_df)
-    total_comments = len(comments_df)
-    total_additions = int(commits_stats_df["additions"].sum()) if not commits_stats_df.empty else 0
-    total_deletions = int(commits_stats_df["deletions"].sum()) if not commits_stats_df.empty else 0
-    
-    # Workflow stats
-    total_workflow_runs = len(workflow_runs_df)
-    successful_runs = len(workflow_runs_df[workflow_runs_df["conclusion"] == "success"]) if not workflow_runs_df.empty else 0
-    failed_runs = len(workflow_runs_df[workflow_runs_df["conclusion"] == "failure"]) if not workflow_runs_df.empty else 0
-    
-    # Busiest month
-    if not prs_df.empty:
-        prs_df["created_month_name"] = prs_df["created_at"].dt.month_name()
-        top_month = prs_df["created_month_name"].value_counts()
-        busiest_month = top_month.idxmax()
-        busiest_month_prs = int(top_month.max())
-    else:
-        busiest_month = "N/A"
-        busiest_month_prs = 0
-    
-    # Most active repo
-    if not prs_df.empty:
-        top_repo = prs_df["repo_name"].value_counts().head(1)
-        most_active_repo = top_repo.index[0]
-        most_active_repo_prs = int(top_repo.values[0])
-    else:
-        most_active_repo = "N/A"
-        most_active_repo_prs = 0
+            results = calculate_aggregations(*team_dataframes(team, *load_dataframes()))
+        except FileNotFoundError as e:
+            print(f"Error: Data files not found. Please run data collection first.")
+            print(f"Missing file: {e}")
+            return
     
     # Prepare data for web interface
-    web_stats = {
-        "team_size": len(TEAM_MEMBERS),
-        "repo_count": len(repos_df),
-        "total_prs": total_prs,
-        "total_additions": total_additions,
-        "total_deletions": total_deletions,
-        "total_commits": total_commits,
-        "total_comments": total_comments,
-        "busiest_month": busiest_month,
-        "busiest_month_prs": busiest_month_prs,
-        "most_active_repo": most_active_repo,
-        "most_active_repo_prs": most_active_repo_prs,
-        "total_workflow_runs": total_workflow_runs,
-        "successful_workflow_runs": successful_runs,
-        "failed_workflow_runs": failed_runs
-    }
+    web_stats = build_web_stats(results, len(team["members"]))
     
     # Write to JSON file in web directory
-    with open('web/stats.json', 'w') as f:
-        json.dump(web_stats, f, indent=2)
-    
-    print("✓ Generated web/stats.json")
+    if _write_json(path, web_stats):
+        print(f"✓ Generated {path}")
+    else:
+        print(f"✓ {path} is unchanged")
     print(f"\nStats Summary:")
     print(f"  Total PRs: {web_stats['total_prs']}")
     print(f"  Total Commits: {web_stats['total_commits']}")
@@ -98,5 +78,92 @@ def generate_stats_json():
     
     return web_stats
 
+def generate_team_files(teams=TEAMS):
+    """Write web/team-files.json, the stats file and shards directory of each team by name
+
+    The page looks the team of ?team=<name> up in it, as the first team's files
+    have no name suffix. Returns whether the file changed.
+    """
+    path = os.path.join("web", TEAM_FILES)
+    team_files = {team["name"]: {"stats": stats_filename(team, teams), "shards": shards_dirname(team, teams)}
+                  for team in teams}
+    changed = _write_json(path, team_files)
+    print(f"✓ Generated {path}" if changed else f"✓ {path} is unchanged")
+    return changed
+
+
+def member_web_stats(repos_df, user_rollup):
+    """Web stats of one member from the rollup rows of their activity (user_login is theirs)."""
+    user_repos = repos_df[repos_df["full_name"].isin(user_rollup.loc[user_rollup["prs"] > 0, "repo_full_name"])]
+    return build_web_stats(calculate_aggregations(user_repos, user_rollup), 1)
+
+
+def repo_web_stats(repos_df, full_name, repo_rollup):
+    """Web stats of repository full_name from its rollup rows; the team size is its PR authors."""
+    contributors = repo_rollup.loc[repo_rollup["prs"] > 0, "user_login"].nunique()
+    return build_web_stats(
+        calculate_aggregations(repos_df[repos_df["full_name"] == full_name], repo_rollup), contributors)
+
+
+def generate_shards(team, repos_df, rollup_df):
+    """Write the stats of each member and repository of team for the web interface
+
+    Every member and repository gets a small file shaped like stats.json
+    (<shards>/users/<login>.json, <shards>/repos/<name>.json), which the page
+    only loads when it is opened, plus an index.json listing them. repos_df
+    and rollup_df are the team's, see teams.team_dataframes. Only files whose
+    content changed are written; returns their paths and those removed.
+    """
+    directory = os.path.join("web", shards_dirname(team))
+    index = {"users": [], "repos": []}
+    written = set()
+    changed = []
+
+    def write(path, web_stats):
+        written.add(os.path.join(directory, path))
+        if _write_json(os.path.join(directory, path), web_stats):
+            changed.append(os.path.join(directory, path))
+
+    rollup_by_user = dict(tuple(rollup_df.groupby("user_login")))
+    for login in team["members"]:
+        web_stats = member_web_stats(repos_df, rollup_by_user.get(login, rollup_df.iloc[0:0]))
+        path = f"users/{slug(login)}.json"
+        write(path, web_stats)
+        index["users"].append({"login": login, "file": path, "total_prs": web_stats["total_prs"]})
+
+    rollup_by_repo = dict(tuple(rollup_df.groupby("repo_full_name")))
+    for repo in repos_df.itertuples():
+        web_stats = repo_web_stats(repos_df, repo.full_name,
+                                   rollup_by_repo.get(repo.full_name, rollup_df.iloc[0:0]))
+        path = f"repos/{slug(repo.name)}.json"
+        write(path, web_stats)
+        index["repos"].append({"name": repo.name, "file": path, "total_prs": web_stats["total_prs"]})
+
+    for entries in index.values():
+        entries.sort(key=lambda entry: -entry["total_prs"])
+    write("index.json", index)
+    # Members and repositories that left don't linger
+    changed.extend(remove_stale(directory, written))
+    print(f"✓ Generated {directory}/ ({len(index['users'])} members, {len(index['repos'])} repositories,"
+          f" {len(changed)} files changed)")
+    return changed
+
+
+def generate_all_stats_json(dataframes=None):
+    """Generate the stats files and member/repository shards of every team, loading the data once."""
+    if dataframes is None:
+        try:
+            dataframes = load_dataframes()
+        except FileNotFoundError as e:
+            print(f"Error: Data files not found. Please run data collection first.")
+            print(f"Missing file: {e}")
+            return
+    for team in TEAMS:
+        team_frames = team_dataframes(team, *dataframes)
+        generate_stats_json(calculate_aggregations(*team_frames), team)
+        generate_shards(team, *team_frames)
+    generate_team_files()
+
+
 if __name__ == "__main__":
-    generate_stats_json()
+    generate_all_stats_json()
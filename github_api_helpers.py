@@ -1,64 +1,162 @@
 """
 Helper functions for interacting with GitHub API
 """
-import requests
+import threading
 import time
-from config import HEADERS, SINCE_DATE
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from urllib.parse import parse_qs, parse_qsl, urlencode, urlsplit, urlunsplit
+from config import SINCE_DATE, GITHUB_API_URL, MAX_WORKERS, PREFETCH_PAGES
+from http_session import get_session
+from rate_limiter import RateLimitScheduler
+from response_cache import get_cache
+from run_metrics import metrics
+
+# Shared by every worker thread so they all spend the same rate limit budget
+scheduler = RateLimitScheduler()
+
+# Prefetched pages are fetched by one pool shared by all listings
+_prefetch_executor = None
+_prefetch_lock = threading.Lock()
+
+# Workflow runs filtered by creation date are capped at this many results
+ACTIONS_FILTER_LIMIT = 1000
+
+
+def _get(url, params=None):
+    """GET a GitHub API url through the response cache and the rate limit scheduler."""
+    def send(extra_headers=None):
+        return scheduler.request(metrics.timed(get_session().get), url, params=params,
+                                 headers=extra_headers)
+
+    cache = get_cache()
+    if cache is None:
+        return send()
+    return cache.get(url, params, send)
+
+
+def graphql_query(query, variables=None):
+    """Run a GitHub GraphQL query through the rate limit scheduler and return its data."""
+    response = scheduler.request(metrics.timed(get_session().post), f"{GITHUB_API_URL}/graphql",
+                                 json={"query": query, "variables": variables or {}})
+    response.raise_for_status()
+    payload = response.json()
+    if payload.get("errors"):
+        raise RuntimeError(f"GraphQL error: {payload['errors'][0].get('message')}")
+    return payload["data"]
+
+
+def _fetch_page(url, params=None):
+    response = _get(url, params=params)
+    response.raise_for_status()
+    return response
+
+
+def _page_number(url):
+    values = parse_qs(urlsplit(url).query).get("page")
+    return int(values[0]) if values else None
+
+
+def _with_page(url, page):
+    """url with its page query parameter set to page."""
+    parts = urlsplit(url)
+    query = [(key, value) for key, value in parse_qsl(parts.query) if key != "page"]
+    return urlunsplit(parts._replace(query=urlencode(query + [("page", page)])))
+
+
+def _get_prefetch_executor():
+    global _prefetch_executor
+    with _prefetch_lock:
+        if _prefetch_executor is None:
+            _prefetch_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS,
+                                                    thread_name_prefix="prefetch")
+        return _prefetch_executor
+
+
+def _prefetched_pages(next_url, last_url):
+    """Yield the responses of the pages from next_url to last_url, fetching PREFETCH_PAGES ahead."""
+    first, last = _page_number(next_url), _page_number(last_url)
+    urls = iter([_with_page(next_url, page) for page in range(first, last + 1)])
+    executor = _get_prefetch_executor()
+    fetch_page = metrics.profiled(_fetch_page)
+    window = deque(executor.submit(fetch_page, url) for url in islice(urls, PREFETCH_PAGES))
+    try:
+        while window:
+            response = window.popleft().result()
+            for url in islice(urls, 1):
+                window.append(executor.submit(fetch_page, url))
+            yield response
+    finally:
+        for future in window:
+            future.cancel()
+
+
+def paginate(url, params=None, items=None, stop=None):
+    """Yield the items of every page of a GitHub API listing, following the Link header.
+
+    params only apply to the first request, later page urls carry them. items
+    extracts the list from a page (default: the page itself). stop is the
+    early termination of listings sorted newest first: pagination ends at the
+    first item it is true for, which is left out. Listings without stop are
+    read to the end, so once the Link header gives the last page the remaining
+    pages are prefetched concurrently.
+    """
+    items = items or (lambda data: data)
+    response = _fetch_page(url, params)
+    while True:
+        for item in items(response.json()):
+            if stop is not None and stop(item):
+                return
+            yield item
+        links = response.links
+        if "next" not in links:
+            return
+        if (stop is None and "last" in links and _page_number(links["next"]["url"]) is not None
+                and _page_number(links["last"]["url"]) is not None):
+            for response in _prefetched_pages(links["next"]["url"], links["last"]["url"]):
+                yield from items(response.json())
+            return
+        response = _fetch_page(links["next"]["url"])
 
 
 def fetch_org_repos(org_name):
     """Fetch all repositories for an organization."""
-    url = f"https://api.github.com/orgs/{org_name}/repos"
-    params = {"per_page": 100}
-    repos = []
-    while url:
-        response = requests.get(url, headers=HEADERS, params=params)
-        response.raise_for_status()
-        repos.extend(response.json())
-        url = response.links.get("next", {}).get("url")  # Handle pagination
-    return repos
+    return list(paginate(f"{GITHUB_API_URL}/orgs/{org_name}/repos", {"per_page": 100}))
 
 
 def fetch_comments(repo, endpoint):
     """Fetch comments for a given repository and endpoint."""
-    url = f"https://api.github.com/repos/{repo}/{endpoint}"
-    params = {"since": SINCE_DATE, "per_page": 100}
-    comments = []
-    while url:
-        response = requests.get(url, headers=HEADERS, params=params)
-        response.raise_for_status()
-        comments.extend(response.json())
-        url = response.links.get("next", {}).get("url")  # Handle pagination
-    return comments
-
-
-def fetch_comments_url(url):
-    """Fetch comments or commits from a given url."""
-    params = {"since": SINCE_DATE, "per_page": 100}
-    comments = []
-    while url:
-        response = requests.get(url, headers=HEADERS, params=params)
-        response.raise_for_status()
-        comments.extend(response.json())
-        url = response.links.get("next", {}).get("url")  # Handle pagination
-    return comments
-
-
-def fetch_prs(repo):
-    """Fetch pull requests for a repository."""
-    url = f"https://api.github.com/repos/{repo}/pulls"
-    params = {"state": "all", "since": SINCE_DATE,
-              "sort": "created", "direction": "desc", "per_page": 100}
-    prs = []
-    while url:
-        response = requests.get(url, headers=HEADERS, params=params)
-        response.raise_for_status()
-        response_prs = response.json()
-        prs.extend(response_prs)
-        if len(response_prs) > 0 and response_prs[-1]["created_at"] < SINCE_DATE:
-            break
-        url = response.links.get("next", {}).get("url")  # Handle pagination
-    return prs
+    return list(paginate(f"{GITHUB_API_URL}/repos/{repo}/{endpoint}",
+                         {"since": SINCE_DATE, "per_page": 100}))
+
+
+def fetch_comments_url(url, since=SINCE_DATE):
+    """Fetch the review comments, issue comments or commits of a pull request from url.
+
+    Issue comments are filtered by the API with since. Review comments are
+    listed newest update first and pagination stops at the first one updated
+    before since. The commit list has no date filter and is fetched whole.
+    """
+    if url.endswith("/commits"):
+        return list(paginate(url, {"per_page": 100}))
+    if "/pulls/" in url:
+        params = {"since": since, "sort": "updated", "direction": "desc", "per_page": 100}
+        return list(paginate(url, params, stop=lambda comment: comment["updated_at"] < since))
+    return list(paginate(url, {"since": since, "per_page": 100}))
+
+
+def fetch_prs(repo, updated_since=None):
+    """Fetch pull requests for a repository.
+
+    Pull requests are listed newest first and pagination stops at the first
+    one created before SINCE_DATE. With updated_since they are listed by last
+    update instead, and only those updated at or after it are returned.
+    """
+    sort_key, cutoff = ("updated_at", updated_since) if updated_since else ("created_at", SINCE_DATE)
+    params = {"state": "all", "sort": sort_key.split("_")[0], "direction": "desc", "per_page": 100}
+    return list(paginate(f"{GITHUB_API_URL}/repos/{repo}/pulls", params,
+                         stop=lambda pr: pr[sort_key] < cutoff))
 
 
 def filter_prs_by_date(prs):
@@ -71,10 +169,38 @@ def filter_prs_by_collaboarators(prs, team_members):
     return [pr for pr in prs if pr["user"]["login"] in team_members]
 
 
+# The search API returns at most this many results per query
+SEARCH_RESULT_LIMIT = 1000
+
+
+class _SearchLimitExceeded(Exception):
+    pass
+
+
+def search_pr_repos(org_name, author, since=SINCE_DATE):
+    """Return the full names of the repositories of org_name with pull requests by author since since.
+
+    Returns None when the search results are incomplete or exceed
+    SEARCH_RESULT_LIMIT, in which case they can't be relied on.
+    """
+    url = f"{GITHUB_API_URL}/search/issues"
+    params = {"q": f"org:{org_name} author:{author} is:pr created:>={since}", "per_page": 100}
+
+    def items_of(results):
+        if results.get("incomplete_results") or results["total_count"] > SEARCH_RESULT_LIMIT:
+            raise _SearchLimitExceeded()
+        return results["items"]
+
+    try:
+        return {item["repository_url"].split("/repos/", 1)[1] for item in paginate(url, params, items_of)}
+    except _SearchLimitExceeded:
+        return None
+
+
 def get_commit_details(repo, commit_sha):
     """Fetch commit details."""
-    commit_url = f"https://api.github.com/repos/{repo}/commits/{commit_sha}"
-    response = requests.get(commit_url, headers=HEADERS)
+    commit_url = f"{GITHUB_API_URL}/repos/{repo}/commits/{commit_sha}"
+    response = _get(commit_url)
     return response.json()
 
 
@@ -83,50 +209,45 @@ def get_gh_repo_commit_stats(repo):
        This implementation fixes a bug with Github API returning empty list 
        for data that has not been cached yet."""
     stats_url_ui = f"https://github.com/{repo}/graphs/code-frequency"
-    stats_url_api = f"https://api.github.com/repos/{repo}/stats/code-frequency"
-    _ = requests.get(stats_url_ui, headers=HEADERS)
+    stats_url_api = f"{GITHUB_API_URL}/repos/{repo}/stats/code-frequency"
+    _ = get_session().get(stats_url_ui)
     time.sleep(1)
 
     stats = {}
     while len(stats) == 0:
-        response = requests.get(stats_url_api, headers=HEADERS)
+        response = _get(stats_url_api)
         stats = response.json()
         time.sleep(1)
     return stats
 
 
-def fetch_workflow_runs(repo):
-    """Fetch workflow runs for a repository."""
-    url = f"https://api.github.com/repos/{repo}/actions/runs"
-    params = {"per_page": 100}
-    runs = []
-    while url:
-        response = requests.get(url, headers=HEADERS, params=params)
-        response.raise_for_status()
-        response_data = response.json()
-        workflow_runs = response_data.get("workflow_runs", [])
-        
-        # Filter by date
-        for run in workflow_runs:
-            if run["created_at"] >= SINCE_DATE:
-                runs.append(run)
-            else:
-                # Stop pagination if we've gone past our date range
-                return runs
-        
-        url = response.links.get("next", {}).get("url")
+def fetch_workflow_runs(repo, after_id=None):
+    """Fetch workflow runs for a repository created since SINCE_DATE, newer than run after_id if given.
+
+    The API filters the runs by creation date, but a filtered listing stops
+    after ACTIONS_FILTER_LIMIT runs; busier repositories are read further
+    without the filter, newest first, until SINCE_DATE.
+    """
+    url = f"{GITHUB_API_URL}/repos/{repo}/actions/runs"
+
+    def runs_of(data):
+        return data.get("workflow_runs", [])
+
+    def before_mark(run):
+        return after_id is not None and run["id"] <= after_id
+
+    params = {"created": f">={SINCE_DATE}", "per_page": 100}
+    runs = list(paginate(url, params, runs_of, before_mark if after_id is not None else None))
+    if len(runs) >= ACTIONS_FILTER_LIMIT:
+        seen = {run["id"] for run in runs}
+        params = {"per_page": 100, "page": ACTIONS_FILTER_LIMIT // 100 + 1}
+        older = paginate(url, params, runs_of,
+                         lambda run: run["created_at"] < SINCE_DATE or before_mark(run))
+        runs.extend(run for run in older if run["id"] not in seen)
     return runs
 
 
 def fetch_workflows(repo):
     """Fetch all workflows for a repository."""
-    url = f"https://api.github.com/repos/{repo}/actions/workflows"
-    params = {"per_page": 100}
-    workflows = []
-    while url:
-        response = requests.get(url, headers=HEADERS, params=params)
-        response.raise_for_status()
-        response_data = response.json()
-        workflows.extend(response_data.get("workflows", []))
-        url = response.links.get("next", {}).get("url")
-    return workflows
+    return list(paginate(f"{GITHUB_API_URL}/repos/{repo}/actions/workflows", {"per_page": 100},
+                         lambda data: data.get("workflows", [])))
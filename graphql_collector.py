@@ -0,0 +1,258 @@
+"""
+GraphQL backed collection of pull requests with their comments and commits
+
+Produces the same records as the REST collector in data_collection.py, but
+fetches each page of pull requests together with their comments, review
+comments and commit additions/deletions in a single query.
+"""
+from config import TEAMS, SINCE_DATE, GITHUB_API_URL
+from github_api_helpers import (
+    fetch_workflow_runs,
+    graphql_query,
+    scheduler
+)
+from concurrency import iter_concurrently
+from job_journal import JobJournal, is_retryable
+from data_collection import fetch_all_org_repos
+from records import Comment, Commit, CommitStats, PullRequest, as_records, intern, project_repo, project_run
+from text_metrics import text_metrics
+from run_metrics import metrics
+from teams import members_by_org
+from discovery import discover_relevant_repos
+
+PR_PAGE_SIZE = 25
+
+COMMENT_FIELDS = "databaseId body createdAt updatedAt url author { login } reactions { totalCount }"
+COMMIT_FIELDS = ("commit { oid message additions deletions "
+                 "author { name email date user { login } } committer { name email date } }")
+REVIEW_FIELDS = "id comments(first: 50) { %s nodes { %s } }"
+PAGE_INFO = "pageInfo { hasNextPage endCursor }"
+
+PR_FIELDS = f"""
+    id databaseId number title state createdAt updatedAt closedAt mergedAt url
+    author {{ login }}
+    baseRepository {{ nameWithOwner }}
+    headRefName headRepository {{ nameWithOwner }}
+    comments(first: 100) {{ {PAGE_INFO} nodes {{ {COMMENT_FIELDS} }} }}
+    reviews(first: 20) {{ {PAGE_INFO} nodes {{ {REVIEW_FIELDS % (PAGE_INFO, COMMENT_FIELDS)} }} }}
+    commits(first: 100) {{ {PAGE_INFO} nodes {{ {COMMIT_FIELDS} }} }}
+"""
+
+PULL_REQUESTS_QUERY = f"""
+query($owner: String!, $name: String!, $cursor: String, $orderBy: IssueOrderField!) {{
+  repository(owner: $owner, name: $name) {{
+    pullRequests(first: {PR_PAGE_SIZE}, after: $cursor, orderBy: {{field: $orderBy, direction: DESC}}) {{
+      {PAGE_INFO}
+      nodes {{ {PR_FIELDS} }}
+    }}
+  }}
+}}
+"""
+
+# Follow-up query for connections that did not fit in the first page
+CONNECTION_QUERY = """
+query($id: ID!, $cursor: String) {
+  node(id: $id) {
+    ... on %(type)s {
+      %(name)s(first: 100, after: $cursor) { %(page_info)s nodes { %(fields)s } }
+    }
+  }
+}
+"""
+
+
+def fetch_remaining(connection, node_id, type_name, name, fields, query=graphql_query):
+    """Return every node of a connection, fetching the pages after the first one."""
+    nodes = list(connection["nodes"])
+    page_info = connection["pageInfo"]
+    while page_info["hasNextPage"]:
+        data = query(
+            CONNECTION_QUERY % {"type": type_name, "name": name, "page_info": PAGE_INFO, "fields": fields},
+            {"id": node_id, "cursor": page_info["endCursor"]},
+        )
+        connection = data["node"][name]
+        nodes.extend(connection["nodes"])
+        page_info = connection["pageInfo"]
+    return nodes
+
+
+def fetch_pull_requests(repo, updated_since=None, query=graphql_query):
+    """Fetch pull request nodes of a repository, newest first.
+
+    Like fetch_prs, pagination stops once pull requests are older than
+    SINCE_DATE, or than updated_since when given.
+    """
+    owner, name = repo.split("/")
+    order_by, sort_key, cutoff = (("UPDATED_AT", "updatedAt", updated_since) if updated_since
+                                  else ("CREATED_AT", "createdAt", SINCE_DATE))
+    nodes = []
+    cursor = None
+    while True:
+        data = query(PULL_REQUESTS_QUERY,
+                     {"owner": owner, "name": name, "cursor": cursor, "orderBy": order_by})
+        connection = data["repository"]["pullRequests"]
+        nodes.extend(connection["nodes"])
+        if not connection["pageInfo"]["hasNextPage"]:
+            break
+        if connection["nodes"] and connection["nodes"][-1][sort_key] < cutoff:
+            break
+        cursor = connection["pageInfo"]["endCursor"]
+    if updated_since:
+        nodes = [node for node in nodes if node["updatedAt"] >= updated_since]
+    return nodes
+
+
+def _login(actor):
+    return intern(actor["login"]) if actor else None
+
+
+def pr_record(node):
+    """Convert a pull request node to a pull request record (see records.project_pr)."""
+    repo = intern(node["baseRepository"]["nameWithOwner"])
+    return PullRequest(
+        id=node["databaseId"],
+        number=node["number"],
+        title=node["title"],
+        state="open" if node["state"] == "OPEN" else "closed",
+        created_at=node["createdAt"],
+        updated_at=node["updatedAt"],
+        closed_at=node["closedAt"],
+        merged_at=node["mergedAt"],
+        html_url=node["url"],
+        user_login=_login(node["author"]),
+        repo_name=intern(repo.split("/")[1]),
+        repo_full_name=repo,
+        head_ref=node["headRefName"],
+        head_repo_full_name=(node["headRepository"] or {}).get("nameWithOwner"),
+    )
+
+
+def comment_record(node, pr_id=None):
+    """Convert an issue or review comment node to a comment record (see records.project_comment)."""
+    return Comment(
+        id=node["databaseId"],
+        body=node["body"],
+        created_at=node["createdAt"],
+        updated_at=node["updatedAt"],
+        html_url=node["url"],
+        user_login=_login(node["author"]),
+        repo_name=intern(node["url"].split("/")[4]),
+        pr_id=pr_id,
+        **text_metrics(node["body"]),
+        reactions=node["reactions"]["totalCount"] if node.get("reactions") else None,
+    )
+
+
+def commit_record(node, repo, pr_id=None):
+    """Convert a pull request commit node to a commit record (see records.project_commit)."""
+    commit = node["commit"]
+    author = commit["author"] or {}
+    committer = commit["committer"] or {}
+    return Commit(
+        url=f"{GITHUB_API_URL}/repos/{repo}/git/commits/{commit['oid']}",
+        sha=commit["oid"],
+        message=commit["message"],
+        author_name=intern(author.get("name")),
+        author_date=author.get("date"),
+        committer_name=intern(committer.get("name")),
+        committer_date=committer.get("date"),
+        user_login=_login(author.get("user")),
+        repo_name=intern(repo.split("/")[1]),
+        pr_id=pr_id,
+    )
+
+
+def collect_pr_nodes(node, query=graphql_query):
+    """Return the comment records and every commit node of a pull request node."""
+    comments = fetch_remaining(node["comments"], node["id"], "PullRequest", "comments",
+                               COMMENT_FIELDS, query)
+    reviews = fetch_remaining(node["reviews"], node["id"], "PullRequest", "reviews",
+                              REVIEW_FIELDS % (PAGE_INFO, COMMENT_FIELDS), query)
+    for review in reviews:
+        comments.extend(fetch_remaining(review["comments"], review["id"], "PullRequestReview",
+                                        "comments", COMMENT_FIELDS, query))
+    commits = fetch_remaining(node["commits"], node["id"], "PullRequest", "commits",
+                              COMMIT_FIELDS, query)
+    return [comment_record(comment, node["databaseId"]) for comment in comments], commits
+
+
+def collect_repo(repo, marks=None, query=graphql_query, members=()):
+    """Collect the pull requests of members in one repository with their comments, commits and runs.
+
+    Returns the pull requests, comments, commits, commit stats, workflow runs
+    and every pull request record that was fetched (for checkpoints).
+    """
+    marks = marks or {}
+    nodes = fetch_pull_requests(repo["full_name"], marks.get("pr_updated_at"), query)
+    fetched_prs = [pr_record(node) for node in nodes]
+
+    prs, comments, commits, commits_stats = [], [], [], []
+    for node, pr in zip(nodes, fetched_prs):
+        # Same filters as filter_prs_by_date and filter_prs_by_collaboarators, on records
+        if pr.created_at < SINCE_DATE or pr.user_login not in members:
+            continue
+        pr_comments, commit_nodes = collect_pr_nodes(node, query)
+        prs.append(pr)
+        comments.extend(pr_comments)
+        commits.extend(commit_record(commit, repo["full_name"], pr.id) for commit in commit_nodes)
+        commits_stats.extend(CommitStats(c["commit"]["oid"], c["commit"]["additions"], c["commit"]["deletions"])
+                             for c in commit_nodes)
+
+    runs = []
+    try:
+        runs = fetch_workflow_runs(repo["full_name"], after_id=marks.get("workflow_run_id"))
+    except Exception as e:
+        if is_retryable(e):
+            raise
+        print(f"\nNote: Could not fetch workflows for {repo['full_name']}: {e}")
+    return prs, comments, commits, commits_stats, [project_run(run) for run in runs], fetched_prs
+
+
+# Tables of the records returned by collect_repo
+RESULT_TABLES = ("relevant_prs", "relevant_prs_comments", "relevant_prs_commits", "commits_stats",
+                 "workflow_runs", "relevant_prs")
+
+
+def collect_github_data_graphql(writer, checkpoints=None, query=graphql_query, teams=TEAMS, journal=None):
+    """Collect all GitHub data through the GraphQL API.
+
+    Streams the same records to writer as data_collection.collect_github_data,
+    with every repository a unit of journal (see job_journal.py). query can be
+    replaced by a function replaying recorded responses to run offline.
+    """
+    journal = journal or JobJournal(path="")
+    org_members = members_by_org(teams)
+    with metrics.stage("discovery"):
+        org_repos = discover_relevant_repos(fetch_all_org_repos(org_members), org_members)
+
+    def marks_for(repo_name):
+        return checkpoints.get(repo_name) if checkpoints is not None else {}
+
+    print("Collecting pull requests, comments and commits with GraphQL...")
+    # A commit can belong to several pull requests
+    seen_shas = set()
+    with metrics.stage("graphql collection"):
+        results = iter_concurrently(
+            lambda repo: journal.run(f"repo {repo['full_name']}", collect_repo,
+                                     repo, marks_for(repo["full_name"]), query, org_members[repo["org"]]),
+            org_repos, lambda repo: repo["full_name"])
+        for repo, result in results:
+            if result is None:
+                continue
+            # Results replayed from the journal hold lists of column values
+            prs, comments, commits, stats, runs, fetched_prs = (
+                as_records(table, rows) for table, rows in zip(RESULT_TABLES, result))
+            if checkpoints is not None:
+                checkpoints.advance(repo["full_name"], fetched_prs, comments, runs)
+            writer.write("workflow_runs", runs)
+            if len(prs) > 0:
+                writer.write("relevant_repos", [project_repo(repo)])
+                writer.write("relevant_prs", prs)
+                writer.write("relevant_prs_comments", comments)
+                writer.write("relevant_prs_commits", commits)
+                for stat in stats:
+                    if stat.sha not in seen_shas:
+                        seen_shas.add(stat.sha)
+                        writer.write("commits_stats", [stat])
+
+    print(f"\nRate limit: waited {scheduler.wait_time:.0f}s, retried {scheduler.retries} requests")
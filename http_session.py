@@ -0,0 +1,57 @@
+"""
+Shared HTTP session for GitHub API requests
+"""
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import HEADERS, MAX_WORKERS, REQUEST_TIMEOUT, HTTP_RETRIES, require_token
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class TimeoutSession(requests.Session):
+    """Session that applies a default timeout to every request."""
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def create_session(pool_size=MAX_WORKERS, timeout=REQUEST_TIMEOUT, retries=HTTP_RETRIES):
+    """Create a keep-alive session with a connection pool sized for pool_size workers.
+
+    Connection errors and 5xx responses are retried with backoff here; rate limit
+    responses are left to the RateLimitScheduler.
+    """
+    require_token()
+    session = TimeoutSession(timeout)
+    retry = Retry(
+        total=retries,
+        backoff_factor=1,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "POST"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(HEADERS)
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    return session
+
+
+def get_session():
+    """Return the process wide session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                # Room for the worker threads and the page prefetching threads
+                _session = create_session(pool_size=2 * MAX_WORKERS)
+    return _session
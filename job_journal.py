@@ -0,0 +1,136 @@
+"""
+Journal of the collection units of a run, for retries and resuming
+
+Collection is split into units: one per repository (its pull requests and
+workflow runs), one per pull request (its comments and commits) and one per
+commit (its stats, kept by commit_stats.py). The result of every completed
+unit is committed to a SQLite journal as soon as it is fetched, so a run that
+crashes or is interrupted picks up where it stopped: the next run with the
+same settings replays the journaled results instead of fetching them again.
+
+Units failing with a network or server error are retried with exponential
+backoff. Units that still fail are listed at the end of the run and in the run
+report, and the journal is kept so the next run only fetches those again. The
+journal is removed once a run completes without failures.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import requests
+from config import JOURNAL_PATH, JOURNAL_MAX_AGE, JOB_RETRIES, JOB_BACKOFF
+
+
+def is_retryable(error):
+    """Whether error is transient: a network error or a 5xx response (rate limits are the scheduler's)."""
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code >= 500
+    return isinstance(error, requests.RequestException)
+
+
+class JobJournal:
+    """SQLite journal of the results of the completed units of a run.
+
+    settings identify the run (backend, teams, ...); a journal left by a run
+    with other settings, or older than max_age seconds, is discarded. With an
+    empty path nothing is kept, units are only retried and reported.
+    """
+
+    def __init__(self, path=JOURNAL_PATH, settings=None, retries=JOB_RETRIES, backoff=JOB_BACKOFF,
+                 max_age=JOURNAL_MAX_AGE, clock=time.time, sleep=time.sleep):
+        self.path = path
+        self.retries = retries
+        self.backoff = backoff
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._failures = {}
+        self.replayed = 0
+        self._conn = None
+        if not path:
+            return
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # A unit is safe once committed, even if the process dies right after
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS units (unit TEXT PRIMARY KEY, result TEXT)")
+        settings = json.dumps(settings or {}, sort_keys=True)
+        meta = dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+        if meta.get("settings") != settings or clock() - float(meta.get("started_at", 0)) > max_age:
+            self._conn.execute("DELETE FROM units")
+            self._conn.execute("DELETE FROM meta")
+            self._conn.executemany("INSERT INTO meta VALUES (?, ?)",
+                                   [("settings", settings), ("started_at", str(clock()))])
+        self._conn.commit()
+        done = self._conn.execute("SELECT COUNT(*) FROM units").fetchone()[0]
+        if done:
+            print(f"Resuming the unfinished collection in {path}: {done} units already done")
+
+    def _stored(self, unit):
+        if self._conn is None:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM units WHERE unit = ?", (unit,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def attempt(self, unit, func, *args):
+        """Return func(*args), retrying transient errors with backoff.
+
+        When the last attempt fails the error is recorded as a failure of unit
+        and raised.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                return func(*args)
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.retries:
+                    with self._lock:
+                        self._failures[unit] = f"{type(e).__name__}: {e}"
+                    raise
+                delay = self.backoff * 2 ** attempt
+                print(f"\nRetrying {unit} in {delay:.0f}s: {e}")
+                self._sleep(delay)
+
+    def run(self, unit, func, *args):
+        """Return the journaled result of unit, or run func(*args) (see attempt) and journal its result.
+
+        Results must be JSON serializable; tuples are replayed as lists.
+        """
+        stored = self._stored(unit)
+        if stored is not None:
+            with self._lock:
+                self.replayed += 1
+            return stored
+        result = self.attempt(unit, func, *args)
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute("INSERT OR REPLACE INTO units VALUES (?, ?)", (unit, json.dumps(result)))
+                self._conn.commit()
+        return result
+
+    def failures(self):
+        """Return {unit: error} of the units of this run that could not be collected."""
+        with self._lock:
+            return dict(sorted(self._failures.items()))
+
+    def finish(self):
+        """End the run: print the failed units, and remove the journal when there are none."""
+        failures = self.failures()
+        if self.replayed:
+            print(f"Replayed {self.replayed} units from {self.path}")
+        if failures:
+            print(f"\n⚠️  {len(failures)} units could not be collected and are missing from the data:")
+            for unit, error in failures.items():
+                print(f"  {unit}: {error}")
+            if self._conn is not None:
+                print(f"The next run fetches them again, resuming the rest from {self.path}")
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+            if not failures:
+                for suffix in ("", "-wal", "-shm"):
+                    if os.path.exists(self.path + suffix):
+                        os.remove(self.path + suffix)
+        return failures
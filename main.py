@@ -1,8 +1,30 @@
 """
 Main script to run GitHub Team Wrapped
 """
-from data_collection import collect_github_data, create_dataframes
-from analytics import calculate_aggregations, print_results
+import sys
+from data_collection import collect_github_data, save_collected_data, write_run_report, open_journal
+from dataset_writer import DatasetWriter
+from config import TEAMS
+from analytics import load_dataframes, calculate_aggregations, print_results
+from generate_web_stats import generate_stats_json, generate_shards, generate_team_files
+from run_metrics import metrics
+from teams import team_dataframes
+
+
+def write_team_outputs(dataframes, teams=TEAMS):
+    """Print the results of every team and write their web stats, shards and the team index."""
+    for team in teams:
+        with metrics.stage(f"analytics {team['name']}"):
+            team_frames = team_dataframes(team, *dataframes, teams=teams)
+            results = calculate_aggregations(*team_frames)
+        if len(teams) > 1:
+            print(f"\nTeam {team['name']} ({team['org']})")
+        print_results(results)
+        with metrics.stage(f"web stats {team['name']}"):
+            generate_stats_json(results, team)
+            generate_shards(team, *team_frames)
+    # script.js resolves ?team= through it, the first team's files have no name suffix
+    generate_team_files(teams)
 
 
 def main():
@@ -13,24 +35,28 @@ def main():
     # Step 1: Collect data from GitHub API
     print("STEP 1: Collecting data from GitHub API")
     print("-"*60)
-    relevant_repos, relevant_prs, relevant_prs_comments, relevant_prs_commits, commits_stats, workflow_runs = collect_github_data()
+    writer = DatasetWriter()
+    journal = open_journal()
+    collect_github_data(writer, journal=journal)
     
-    # Step 2: Create and save dataframes
+    # Step 2: Save and load dataframes
     print("\nSTEP 2: Creating dataframes")
     print("-"*60)
-    repos_df, prs_df, comments_df, commits_df, commits_stats_df, workflow_runs_df = create_dataframes(
-        relevant_repos, relevant_prs, relevant_prs_comments, 
-        relevant_prs_commits, commits_stats, workflow_runs
-    )
+    save_collected_data(writer)
+    journal.finish()
+    with metrics.stage("load"):
+        dataframes = load_dataframes()
     
     # Step 3: Calculate aggregations and display results
     print("\nSTEP 3: Calculating statistics")
     print("-"*60)
-    results = calculate_aggregations(repos_df, prs_df, comments_df, commits_df, commits_stats_df)
-    print_results(results)
+    write_team_outputs(dataframes)
     
+    write_run_report(journal)
     print("\n✨ GitHub Team Wrapped complete! ✨")
 
 
 if __name__ == "__main__":
+    # --profile runs every stage under cProfile
+    metrics.profile = "--profile" in sys.argv
     main()
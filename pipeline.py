@@ -0,0 +1,118 @@
+"""
+In-process pipeline of stages that exchange in-memory values
+
+Stages form a DAG by naming the stages whose values they take as inputs.
+Each stage has a key: a content hash of its own fingerprint (e.g. the hash of
+the files it reads) and of the keys of its inputs. Keys are saved after every
+successful stage, and a stage whose key is unchanged since the last run (and
+whose outputs are still there) is skipped. A skipped stage still computes its
+value when a later stage that does run needs it, so unchanged data is neither
+reloaded nor re-rendered.
+"""
+import hashlib
+import json
+import os
+import time
+from graphlib import TopologicalSorter
+from config import PIPELINE_STATE_PATH
+from run_metrics import metrics
+
+
+class Stage:
+    """A step of the pipeline.
+
+    run is called with the values of inputs (stage names) as keyword
+    arguments and returns the stage's value. fingerprint returns the content
+    hash (any JSON value) of what the stage reads besides its inputs; it is
+    called once the inputs have run. outputs returns whether the products of
+    the last run are still in place. Stages with always set run every time
+    (e.g. fetching from GitHub); stages after them fingerprint what they wrote.
+    Each run is a stage of the run metrics, unless timed is False because the
+    stage records its own steps. after names stages that must come first
+    without their values being needed, such as one writing the files this
+    stage reads.
+    """
+
+    def __init__(self, name, run, inputs=(), fingerprint=None, outputs=None, always=False, timed=True,
+                 after=()):
+        self.name = name
+        self.run = run
+        self.inputs = tuple(inputs)
+        self.after = tuple(after)
+        self.fingerprint = fingerprint
+        self.outputs = outputs
+        self.always = always
+        self.timed = timed
+
+
+class Pipeline:
+    """Run stages in dependency order, skipping those whose key is unchanged since the last run."""
+
+    def __init__(self, stages, state_path=PIPELINE_STATE_PATH):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_path = state_path
+        self.state = {}
+        if state_path and os.path.exists(state_path):
+            with open(state_path) as f:
+                self.state = json.load(f)
+        self.keys = {}
+        self.values = {}
+        self.ran = []
+        self.skipped = []
+
+    def order(self):
+        """Stage names in an order where every stage comes after its inputs."""
+        graph = {name: stage.inputs + stage.after for name, stage in self.stages.items()}
+        return list(TopologicalSorter(graph).static_order())
+
+    def _key(self, stage):
+        own = stage.fingerprint() if stage.fingerprint is not None else None
+        payload = json.dumps([stage.name, own, [self.keys[name] for name in stage.inputs + stage.after]],
+                             default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def value(self, name):
+        """Value of stage name, running it now if it was skipped."""
+        if name not in self.values:
+            stage = self.stages[name]
+            inputs = {input_name: self.value(input_name) for input_name in stage.inputs}
+            if stage.timed:
+                with metrics.stage(name):
+                    self.values[name] = stage.run(**inputs)
+            else:
+                self.values[name] = stage.run(**inputs)
+        return self.values[name]
+
+    def run(self, force=()):
+        """Run every stage that is forced, always runs, or has a new key; return True on success."""
+        order = self.order()
+        for number, name in enumerate(order, 1):
+            stage = self.stages[name]
+            progress = f"[{number}/{len(order)}] {name}"
+            self.keys[name] = self._key(stage)
+            unchanged = (self.state.get(name) == self.keys[name]
+                         and (stage.outputs is None or stage.outputs()))
+            if unchanged and not stage.always and name not in force:
+                print(f"\n⏭️  {progress}: inputs unchanged, skipped")
+                self.skipped.append(name)
+                continue
+            print(f"\n▶️  {progress}")
+            start = time.perf_counter()
+            try:
+                self.value(name)
+            except Exception as e:
+                print(f"❌ {progress} failed: {e}")
+                return False
+            self.ran.append(name)
+            self._save(name)
+            print(f"✓ {progress} done in {time.perf_counter() - start:.1f}s")
+        return True
+
+    def _save(self, name):
+        self.state[name] = self.keys[name]
+        if not self.state_path:
+            return
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
@@ -0,0 +1,96 @@
+"""
+Rate limit aware scheduler for GitHub API requests
+"""
+import threading
+import time
+
+
+class RateLimitScheduler:
+    """Pace GitHub API requests using the rate limit headers of earlier responses.
+
+    Requests go out as fast as callers issue them while the budget lasts. Once a
+    resource (core, search, graphql) is exhausted every caller waits for its
+    X-RateLimit-Reset, and secondary rate limit responses (403/429) are retried
+    after Retry-After or an exponential backoff.
+    """
+
+    def __init__(self, max_retries=5, base_backoff=60, clock=time.time, sleep=time.sleep):
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._remaining = {}
+        self._reset = {}
+        self._blocked_until = 0.0
+        self.wait_time = 0.0
+        self.retries = 0
+
+    @staticmethod
+    def resource_for(url):
+        """Guess which rate limit bucket a url is billed against."""
+        if "/search/" in url:
+            return "search"
+        if url.endswith("/graphql"):
+            return "graphql"
+        return "core"
+
+    def wait(self, resource="core"):
+        """Block until a request against resource is allowed, then reserve it."""
+        while True:
+            with self._lock:
+                now = self._clock()
+                until = self._blocked_until
+                remaining = self._remaining.get(resource)
+                reset = self._reset.get(resource, 0.0)
+                if remaining is not None and remaining <= 0 and reset > now:
+                    until = max(until, reset + 1)
+                if until <= now:
+                    if remaining is not None:
+                        self._remaining[resource] = remaining - 1
+                    return
+                delay = until - now
+                self.wait_time += delay
+            self._sleep(delay)
+
+    def update(self, response, resource="core"):
+        """Record the rate limit state reported by a response."""
+        headers = response.headers
+        resource = headers.get("X-RateLimit-Resource", resource)
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        with self._lock:
+            if remaining is not None:
+                self._remaining[resource] = int(remaining)
+            if reset is not None:
+                self._reset[resource] = float(reset)
+
+    def retry_delay(self, response, attempt):
+        """Return seconds to wait before retrying response, or None if it is final."""
+        if response.status_code not in (403, 429):
+            return None
+        headers = response.headers
+        retry_after = headers.get("Retry-After")
+        if retry_after is not None:
+            return float(retry_after)
+        reset = headers.get("X-RateLimit-Reset")
+        if headers.get("X-RateLimit-Remaining") == "0" and reset is not None:
+            return max(float(reset) - self._clock(), 0) + 1
+        if response.status_code == 429 or "secondary rate limit" in response.text.lower():
+            return self.base_backoff * 2 ** attempt
+        # A plain 403 is a permission problem, retrying will not help
+        return None
+
+    def request(self, get, url, **kwargs):
+        """Issue get(url, **kwargs) under the scheduler, retrying rate limited responses."""
+        resource = self.resource_for(url)
+        for attempt in range(self.max_retries + 1):
+            self.wait(resource)
+            response = get(url, **kwargs)
+            self.update(response, resource)
+            delay = self.retry_delay(response, attempt)
+            if delay is None or attempt == self.max_retries:
+                return response
+            with self._lock:
+                self._blocked_until = max(self._blocked_until, self._clock() + delay)
+                self.retries += 1
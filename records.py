@@ -0,0 +1,197 @@
+"""
+Projection of raw GitHub API payloads to the flat records that are stored
+
+Each function keeps only the fields the analytics and incremental collection
+need, so the full payloads (nested repository objects, links, ...) can be
+dropped as soon as they are fetched. Records are named tuples of the table's
+columns: they hold no per-record dict of field names, so a record takes a
+fraction of the memory of the equivalent dict, and a list of them turns into
+a dataframe (or CSV rows) as is. Logins and repository names are interned,
+so the many records of a user or repository share one copy of each.
+"""
+import sys
+from collections import namedtuple
+from text_metrics import text_metrics
+
+# Schema of each stored table: column -> "int", "string" or "datetime", in column order
+SCHEMAS = {
+    "relevant_repos": {
+        "id": "int", "name": "string", "full_name": "string",
+        "created_at": "datetime", "pushed_at": "datetime",
+    },
+    "relevant_prs": {
+        "id": "int", "number": "int", "title": "string", "state": "string",
+        "created_at": "datetime", "updated_at": "datetime", "closed_at": "datetime",
+        "merged_at": "datetime", "html_url": "string", "user_login": "string",
+        "repo_name": "string", "repo_full_name": "string",
+        # Branch of the pull request and its repository, which differs for forks
+        "head_ref": "string", "head_repo_full_name": "string",
+    },
+    "relevant_prs_comments": {
+        "id": "int", "body": "string", "created_at": "datetime", "updated_at": "datetime",
+        "html_url": "string", "user_login": "string", "repo_name": "string", "pr_id": "int",
+        # Text metrics of the body, see text_metrics.py
+        "body_length": "int", "lgtm": "int", "approval": "int", "thanks": "int",
+        "nit": "int", "question": "int", "emojis": "int",
+        # Emoji reactions to the comment (reactions.total_count)
+        "reactions": "int",
+    },
+    "relevant_prs_commits": {
+        "url": "string", "sha": "string", "message": "string",
+        "author_name": "string", "author_date": "datetime",
+        "committer_name": "string", "committer_date": "datetime",
+        "user_login": "string", "repo_name": "string", "pr_id": "int",
+    },
+    "commits_stats": {"sha": "string", "additions": "int", "deletions": "int"},
+    "workflow_runs": {
+        "id": "int", "name": "string", "event": "string", "status": "string",
+        "conclusion": "string", "run_number": "int", "head_branch": "string",
+        "created_at": "datetime", "updated_at": "datetime", "actor_login": "string",
+        "repo_name": "string",
+    },
+    # Built from the tables above by rollups.py: one row per day, repository,
+    # pull request author and user, with the activity counts of that day
+    "daily_rollup": {
+        "day": "datetime", "repo_full_name": "string", "repo_name": "string",
+        "pr_author": "string", "user_login": "string",
+        "prs": "int", "comments": "int", "lgtm_comments": "int", "approval_comments": "int",
+        "thanks_comments": "int", "nit_comments": "int", "question_comments": "int",
+        "emojis": "int", "reactions": "int", "comment_chars": "int", "commits": "int",
+        "additions": "int", "deletions": "int", "workflow_runs": "int",
+        "successful_workflow_runs": "int", "failed_workflow_runs": "int",
+    },
+}
+
+# Columns of each stored table, in order
+COLUMNS = {table: list(schema) for table, schema in SCHEMAS.items()}
+
+# Tables written by the collection, in order
+COLLECTED_TABLES = [table for table in SCHEMAS if table != "daily_rollup"]
+
+# Record class of each collected table, a named tuple of its columns
+Repo = namedtuple("Repo", COLUMNS["relevant_repos"])
+PullRequest = namedtuple("PullRequest", COLUMNS["relevant_prs"])
+Comment = namedtuple("Comment", COLUMNS["relevant_prs_comments"])
+Commit = namedtuple("Commit", COLUMNS["relevant_prs_commits"])
+CommitStats = namedtuple("CommitStats", COLUMNS["commits_stats"])
+WorkflowRun = namedtuple("WorkflowRun", COLUMNS["workflow_runs"])
+RECORDS = {
+    "relevant_repos": Repo,
+    "relevant_prs": PullRequest,
+    "relevant_prs_comments": Comment,
+    "relevant_prs_commits": Commit,
+    "commits_stats": CommitStats,
+    "workflow_runs": WorkflowRun,
+}
+
+# Column(s) identifying a row, used to deduplicate merged data
+KEYS = {
+    "relevant_repos": "id",
+    "relevant_prs": "id",
+    "relevant_prs_comments": "id",
+    "relevant_prs_commits": "url",
+    "commits_stats": "sha",
+    "workflow_runs": "id",
+    "daily_rollup": ["day", "repo_full_name", "pr_author", "user_login"],
+}
+
+
+def as_records(table, rows):
+    """rows as records of table; rows may be sequences of its column values, e.g. records replayed from JSON."""
+    record = RECORDS[table]
+    return [row if isinstance(row, record) else record._make(row) for row in rows]
+
+
+def intern(name):
+    """name (a login or repository name) interned, None stays None."""
+    return sys.intern(name) if name is not None else None
+
+
+def _login(user):
+    return intern(user.get("login")) if user else None
+
+
+def project_repo(repo):
+    """Project a repository payload."""
+    return Repo(
+        id=repo.get("id"),
+        name=intern(repo.get("name")),
+        full_name=intern(repo.get("full_name")),
+        created_at=repo.get("created_at"),
+        pushed_at=repo.get("pushed_at"),
+    )
+
+
+def project_pr(pr):
+    """Project a pull request payload."""
+    repo_full_name = intern(pr["base"]["repo"]["full_name"])
+    return PullRequest(
+        id=pr["id"],
+        number=pr["number"],
+        title=pr.get("title"),
+        state=pr.get("state"),
+        created_at=pr["created_at"],
+        updated_at=pr["updated_at"],
+        closed_at=pr.get("closed_at"),
+        merged_at=pr.get("merged_at"),
+        html_url=pr.get("html_url"),
+        user_login=_login(pr["user"]),
+        repo_name=intern(repo_full_name.split("/")[1]),
+        repo_full_name=repo_full_name,
+        head_ref=pr["head"]["ref"],
+        # The head repository is missing once a fork is deleted
+        head_repo_full_name=(pr["head"].get("repo") or {}).get("full_name"),
+    )
+
+
+def project_comment(comment, pr_id=None):
+    """Project an issue or review comment payload of pull request pr_id."""
+    return Comment(
+        id=comment["id"],
+        body=comment.get("body"),
+        created_at=comment.get("created_at"),
+        updated_at=comment.get("updated_at"),
+        html_url=comment["html_url"],
+        user_login=_login(comment.get("user")),
+        repo_name=intern(comment["html_url"].split("/")[4]),
+        pr_id=pr_id,
+        **text_metrics(comment.get("body")),
+        reactions=(comment.get("reactions") or {}).get("total_count"),
+    )
+
+
+def project_commit(commit, pr_id=None):
+    """Project an entry of the commit list of pull request pr_id."""
+    git_commit = commit["commit"]
+    author = git_commit.get("author") or {}
+    committer = git_commit.get("committer") or {}
+    url = git_commit["url"]
+    return Commit(
+        url=url,
+        sha=commit.get("sha") or url.rsplit("/", 1)[1],
+        message=git_commit.get("message"),
+        author_name=intern(author.get("name")),
+        author_date=author.get("date"),
+        committer_name=intern(committer.get("name")),
+        committer_date=committer.get("date"),
+        user_login=_login(commit.get("author")),
+        repo_name=intern(url.split("/repos/", 1)[1].split("/")[1]),
+        pr_id=pr_id,
+    )
+
+
+def project_run(run):
+    """Project a workflow run payload."""
+    return WorkflowRun(
+        id=run["id"],
+        name=run.get("name"),
+        event=run.get("event"),
+        status=run.get("status"),
+        conclusion=run.get("conclusion"),
+        run_number=run.get("run_number"),
+        head_branch=run.get("head_branch"),
+        created_at=run["created_at"],
+        updated_at=run.get("updated_at"),
+        actor_login=_login(run.get("actor")),
+        repo_name=intern(run["repository"]["full_name"]) if run.get("repository") else None,
+    )
@@ -0,0 +1,195 @@
+"""
+Persistent cache of GitHub API responses with conditional request support
+"""
+import atexit
+import json
+import re
+import sqlite3
+import threading
+import time
+import requests
+from requests.structures import CaseInsensitiveDict
+from config import CACHE_PATH, CACHE_MAX_BYTES
+
+# Seconds a cached response is served without asking GitHub, first matching pattern wins.
+# Anything else is always revalidated with If-None-Match, which costs no rate limit when unchanged.
+DEFAULT_TTLS = [
+    (re.compile(r"/repos/[^/]+/[^/]+/commits/[0-9a-f]{40}$"), float("inf")),  # commits are immutable
+    (re.compile(r"/orgs/[^/]+/repos$"), 3600),
+]
+
+# Access times of cache hits are written in batches of this many, a commit per hit costs a sync
+TOUCH_BATCH = 500
+
+# Only these headers are needed to rebuild a response (pagination and validators)
+_KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Link")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+class ResponseCache:
+    """SQLite backed response cache keyed by url and query parameters.
+
+    Entries are evicted least recently used first once the stored bodies exceed
+    max_bytes. Access times are written in batches (see flush), which only
+    makes eviction slightly less precise if the process dies before one.
+    """
+
+    def __init__(self, path, max_bytes=CACHE_MAX_BYTES, ttls=DEFAULT_TTLS):
+        self.max_bytes = max_bytes
+        self.ttls = ttls
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, headers TEXT, body BLOB, "
+            "fetched_at REAL, accessed_at REAL, size INTEGER)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        # key -> (accessed_at, fetched_at or None to keep it) not written yet
+        self._touched = {}
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(url, params=None):
+        """Canonical cache key for a GET of url with params."""
+        return requests.Request("GET", url, params=params).prepare().url
+
+    def ttl_for(self, url):
+        """Seconds a response for url stays fresh."""
+        path = url.split("?", 1)[0]
+        for pattern, ttl in self.ttls:
+            if pattern.search(path):
+                return ttl
+        return 0
+
+    def get(self, url, params, send):
+        """Return the response for url, calling send(extra_headers) only when needed."""
+        key = self.key(url, params)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT headers, body, fetched_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            pending = self._touched.get(key)
+        if row is not None and pending is not None and pending[1] is not None:
+            # Revalidated earlier in the run, not written yet
+            row = (row[0], row[1], pending[1])
+        if row is not None:
+            headers, body, fetched_at = json.loads(row[0]), row[1], row[2]
+            if now - fetched_at < self.ttl_for(url):
+                self._touch(key, now)
+                with self._lock:
+                    self.hits += 1
+                return self._build_response(key, headers, body)
+
+        conditional = {}
+        if row is not None:
+            if "ETag" in headers:
+                conditional["If-None-Match"] = headers["ETag"]
+            if "Last-Modified" in headers:
+                conditional["If-Modified-Since"] = headers["Last-Modified"]
+        response = send(conditional)
+
+        if response.status_code == 304 and row is not None:
+            self._touch(key, now, fetched_at=now)
+            with self._lock:
+                self.revalidated += 1
+            return self._build_response(key, headers, body)
+        with self._lock:
+            self.misses += 1
+        if response.status_code == 200:
+            self._store(key, response, now)
+        return response
+
+    def _touch(self, key, now, fetched_at=None):
+        with self._lock:
+            previous = self._touched.get(key)
+            if fetched_at is None and previous is not None:
+                fetched_at = previous[1]
+            self._touched[key] = (now, fetched_at)
+            if len(self._touched) >= TOUCH_BATCH:
+                self._write_touched()
+                self._conn.commit()
+
+    def _write_touched(self):
+        self._conn.executemany(
+            "UPDATE responses SET accessed_at = ?, fetched_at = COALESCE(?, fetched_at) WHERE key = ?",
+            [(accessed_at, fetched_at, key) for key, (accessed_at, fetched_at) in self._touched.items()],
+        )
+        self._touched = {}
+
+    def flush(self):
+        """Write the pending access times of cache hits."""
+        with self._lock:
+            if self._touched:
+                self._write_touched()
+                self._conn.commit()
+
+    def _store(self, key, response, now):
+        headers = {name: response.headers[name] for name in _KEPT_HEADERS if name in response.headers}
+        body = response.content
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if old is not None:
+                self._size -= old[0]
+            self._touched.pop(key, None)
+            # Eviction picks by access time, so it sees the pending ones
+            self._write_touched()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, json.dumps(headers), body, now, now, len(body)),
+            )
+            self._size += len(body)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        while self._size > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed_at LIMIT 100"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self._size <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._size -= size
+                self.evictions += 1
+
+    @staticmethod
+    def _build_response(url, headers, body):
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers = CaseInsensitiveDict(headers)
+        response._content = body
+        response.encoding = "utf-8"
+        return response
+
+    def summary(self):
+        """One line description of the cache counters."""
+        return (f"Cache: {self.hits} hits, {self.revalidated} revalidated (304), "
+                f"{self.misses} misses, {self.evictions} evictions, "
+                f"{self._size / 1024 / 1024:.1f} MB stored")
+
+
+def get_cache():
+    """Return the process wide response cache, or None if caching is disabled."""
+    global _cache
+    if not CACHE_PATH:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(CACHE_PATH)
+                atexit.register(_cache.flush)
+    return _cache
@@ -0,0 +1,174 @@
+"""
+Daily rollup of the collected tables
+
+The rollup has one row per day, repository, pull request author and user,
+holding how many pull requests, comments, commits, changed lines and workflow
+runs fall on it. It is built once after collection, so reports over any
+window or breakdown only read this compact table instead of every event.
+"""
+import pandas as pd
+from records import COLUMNS, KEYS
+from storage import apply_schema, get_storage, read_table
+from text_metrics import TEXT_METRIC_COLUMNS, text_metrics
+
+# Columns of the collected tables the rollup is built from
+ROLLUP_SOURCES = {
+    "relevant_prs": ["id", "created_at", "user_login", "repo_name", "repo_full_name"],
+    "relevant_prs_comments": ["created_at", "user_login", "body", "pr_id", "reactions"] + TEXT_METRIC_COLUMNS,
+    "relevant_prs_commits": ["sha", "author_date", "committer_date", "user_login", "pr_id"],
+    "commits_stats": ["sha", "additions", "deletions"],
+    "workflow_runs": ["created_at", "conclusion", "actor_login", "repo_name"],
+}
+
+DIMENSIONS = KEYS["daily_rollup"] + ["repo_name"]
+
+# Activity counts of the rollup, every column that is not a dimension
+ROLLUP_METRICS = [column for column in COLUMNS["daily_rollup"] if column not in DIMENSIONS]
+
+
+# Rollup column -> comment text metric it sums
+ROLLUP_TEXT_METRICS = {
+    "lgtm_comments": "lgtm",
+    "approval_comments": "approval",
+    "thanks_comments": "thanks",
+    "nit_comments": "nit",
+    "question_comments": "question",
+    "emojis": "emojis",
+    "comment_chars": "body_length",
+}
+
+
+def comment_text_metrics(comments_df):
+    """The text metric columns of comments_df, computed from the body for comments stored without them."""
+    metrics = comments_df[TEXT_METRIC_COLUMNS]
+    missing = metrics["body_length"].isna()
+    if missing.any():
+        computed = pd.DataFrame([text_metrics(body) for body in comments_df["body"][missing].fillna("")],
+                                index=metrics.index[missing], columns=TEXT_METRIC_COLUMNS)
+        metrics = metrics.astype("Int64")
+        metrics.loc[missing] = computed.astype("Int64")
+    return metrics
+
+
+def _day(timestamps):
+    return timestamps.dt.floor("D")
+
+
+def _activity(prs, df, day, user_login):
+    """Frame of the dimensions of the rows of df, belonging to pull requests of prs by pr_id."""
+    pr_by_id = prs.drop_duplicates(subset="id").set_index("id")
+    pr_ids = df["pr_id"]
+    return pd.DataFrame({
+        "day": _day(day),
+        "repo_full_name": pr_ids.map(pr_by_id["repo_full_name"]),
+        "repo_name": pr_ids.map(pr_by_id["repo_name"]),
+        "pr_author": pr_ids.map(pr_by_id["user_login"]),
+        "user_login": user_login,
+    })
+
+
+def build_daily_rollup(prs_df, comments_df, commits_df, commits_stats_df, workflow_runs_df, pr_lookup=None):
+    """Return the daily rollup of the collected tables.
+
+    Comments and commits are attributed to the author of their pull request
+    (looked up in pr_lookup, by default prs_df) as pr_author, so team rollups
+    can be selected by it; workflow runs have no pull request and are kept per
+    repository with the run's actor as user. Additions and deletions stay
+    empty for days without known commit stats.
+    """
+    pr_lookup = prs_df if pr_lookup is None else pr_lookup
+    prs = pd.DataFrame({
+        "day": _day(prs_df["created_at"]),
+        "repo_full_name": prs_df["repo_full_name"],
+        "repo_name": prs_df["repo_name"],
+        "pr_author": prs_df["user_login"],
+        "user_login": prs_df["user_login"],
+        "prs": 1,
+    })
+
+    comments = _activity(pr_lookup, comments_df, comments_df["created_at"], comments_df["user_login"])
+    comments["comments"] = 1
+    metrics = comment_text_metrics(comments_df)
+    for column, metric in ROLLUP_TEXT_METRICS.items():
+        comments[column] = metrics[metric]
+    comments["reactions"] = comments_df["reactions"]
+
+    commits = _activity(pr_lookup, commits_df, commits_df["committer_date"].fillna(commits_df["author_date"]),
+                        commits_df["user_login"])
+    commits["commits"] = 1
+    # A commit in several pull requests only counts its changed lines once
+    stats = commits_stats_df.drop_duplicates(subset="sha").set_index("sha")
+    shas = commits_df["sha"].where(~commits_df["sha"].duplicated())
+    commits["additions"] = shas.map(stats["additions"])
+    commits["deletions"] = shas.map(stats["deletions"])
+
+    conclusion = workflow_runs_df["conclusion"]
+    runs = pd.DataFrame({
+        "day": _day(workflow_runs_df["created_at"]),
+        "repo_full_name": workflow_runs_df["repo_name"],
+        "repo_name": workflow_runs_df["repo_name"].str.split("/").str[1],
+        "pr_author": pd.NA,
+        "user_login": workflow_runs_df["actor_login"],
+        "workflow_runs": 1,
+        "successful_workflow_runs": (conclusion == "success").astype(int),
+        "failed_workflow_runs": (conclusion == "failure").astype(int),
+    })
+
+    frames = [frame for frame in (prs, comments, commits, runs) if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=DIMENSIONS)
+    activity = pd.concat(frames, ignore_index=True)
+    grouped = activity.groupby(DIMENSIONS, dropna=False, sort=True)
+    metrics = [column for column in activity.columns if column not in DIMENSIONS]
+    # min_count keeps changed lines empty rather than 0 where no stats are known
+    rollup = grouped[metrics].sum(min_count=1).reset_index()
+    counts = [column for column in metrics if column not in ("additions", "deletions")]
+    rollup[counts] = rollup[counts].fillna(0)
+    return rollup
+
+
+def update_rollups(storage=None):
+    """Rebuild the daily rollup from the stored tables and save it."""
+    storage = storage or get_storage()
+    sources = []
+    for table, columns in ROLLUP_SOURCES.items():
+        if table == "workflow_runs" and not storage.exists(table):
+            sources.append(apply_schema(pd.DataFrame(), table, columns))
+        else:
+            sources.append(read_table(table, columns, storage))
+    storage.write("daily_rollup", build_daily_rollup(*sources))
+    print(f"✓ Saved {storage.path('daily_rollup')}")
+
+
+def _sources(tables):
+    """The ROLLUP_SOURCES dataframes of tables ({table: dataframe}), empty for the missing ones."""
+    return [apply_schema(tables.get(table, pd.DataFrame()), table, columns)
+            for table, columns in ROLLUP_SOURCES.items()]
+
+
+def update_rollup_incrementally(storage, removed, added, prs_df):
+    """Apply a change of the collected tables to the stored daily rollup without rebuilding it.
+
+    removed and added map tables to the rows that were replaced or deleted and
+    to the rows that replaced them or were inserted. The rollup of the removed
+    rows is subtracted and the rollup of the added rows is added; comments and
+    commits are attributed through prs_df, the pull requests after the change.
+    Changed lines are left to update_rollups, which knows every commit's stats.
+    """
+    before = build_daily_rollup(*_sources(removed), pr_lookup=prs_df).reindex(columns=DIMENSIONS + ROLLUP_METRICS)
+    after = build_daily_rollup(*_sources(added), pr_lookup=prs_df).reindex(columns=DIMENSIONS + ROLLUP_METRICS)
+    before[ROLLUP_METRICS] = -before[ROLLUP_METRICS].astype("Float64")
+    frames = [after, before]
+    if storage.exists("daily_rollup"):
+        frames.insert(0, storage.read("daily_rollup"))
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return
+    activity = pd.concat(frames, ignore_index=True)
+    activity[ROLLUP_METRICS] = activity[ROLLUP_METRICS].astype("Float64")
+    rollup = activity.groupby(DIMENSIONS, dropna=False, sort=True)[ROLLUP_METRICS].sum(min_count=1).reset_index()
+    counts = [column for column in ROLLUP_METRICS if column not in ("additions", "deletions")]
+    rollup[counts] = rollup[counts].fillna(0)
+    # Days left without any activity, e.g. of a deleted comment
+    rollup = rollup[rollup[counts].sum(axis=1) > 0]
+    storage.write("daily_rollup", rollup)
@@ -0,0 +1,202 @@
+"""
+Instrumentation of a run: stage timings, API request statistics and profiles
+
+Every stage and API request of the process is recorded by the shared
+`metrics` object, which writes them as a JSON run report at the end of the
+run. Comparing reports between runs shows where time goes as the org grows.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+from contextlib import contextmanager
+from config import GITHUB_API_URL, RUN_REPORT_PATH, PROFILE_DIR
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_SHA = re.compile(r"^[0-9a-f]{40}$")
+
+
+def endpoint_of(url):
+    """Template of the API endpoint of url, e.g. /repos/:owner/:repo/pulls/:number/comments."""
+    path = url.split("?", 1)[0]
+    if path.startswith(GITHUB_API_URL):
+        path = path[len(GITHUB_API_URL):]
+    segments = path.strip("/").split("/")
+    template = []
+    for i, segment in enumerate(segments):
+        if i == 1 and segments[0] in ("orgs", "repos"):
+            segment = ":org" if segments[0] == "orgs" else ":owner"
+        elif i == 2 and segments[0] == "repos":
+            segment = ":repo"
+        elif segment.isdigit():
+            segment = ":number"
+        elif _SHA.match(segment):
+            segment = ":sha"
+        template.append(segment)
+    return "/" + "/".join(template)
+
+
+def _response_bytes(response):
+    """Bytes of response on the wire: its Content-Length, else the size of its decoded body."""
+    if response is None:
+        return 0
+    length = response.headers.get("Content-Length")
+    if length is not None and length.isdigit():
+        return int(length)
+    return len(response.content)
+
+
+class RunMetrics:
+    """Thread safe collector of the timings and request statistics of one run.
+
+    With profile set every stage also runs under cProfile and its statistics
+    are saved to PROFILE_DIR. cProfile only sees the thread that enables it, so
+    the thread pools wrap their tasks in profiled, whose profiles are merged
+    into those of the stages in progress.
+    """
+
+    def __init__(self, profile=False, clock=time.perf_counter):
+        self.profile = profile
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._started = clock()
+        self.stages = []
+        self.endpoints = {}
+        # Merged profiles of the pool tasks of each profiled stage in progress
+        self._task_stats = []
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as stage name (and profile it with profile set)."""
+        profiler = cProfile.Profile() if self.profile else None
+        task_stats = pstats.Stats()
+        start = self._clock()
+        if profiler is not None:
+            with self._lock:
+                self._task_stats.append(task_stats)
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                with self._lock:
+                    self._task_stats.remove(task_stats)
+            seconds = self._clock() - start
+            entry = {"name": name, "seconds": round(seconds, 3)}
+            if profiler is not None:
+                entry["profile"] = self._save_profile(name, profiler, task_stats)
+            with self._lock:
+                self.stages.append(entry)
+
+    def profiled(self, func):
+        """Wrap func, run on a pool thread, so its calls count in the profiles of the stages in progress."""
+        def profiled_func(*args, **kwargs):
+            with self._lock:
+                targets = list(self._task_stats)
+            if not targets:
+                return func(*args, **kwargs)
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Python 3.12+ allows one profiler per process, which then sees every thread
+                return func(*args, **kwargs)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.disable()
+                stats = pstats.Stats(profiler)
+                with self._lock:
+                    for task_stats in targets:
+                        task_stats.add(stats)
+        return profiled_func
+
+    def _save_profile(self, name, profiler, task_stats):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, re.sub(r"\W+", "_", name) + ".prof")
+        summary = io.StringIO()
+        stats = pstats.Stats(profiler, stream=summary)
+        stats.add(task_stats)
+        stats.dump_stats(path)
+        stats.sort_stats("cumulative").print_stats(15)
+        print(f"\nProfile of {name}, all threads (full profile in {path}):\n{summary.getvalue()}")
+        return path
+
+    def record_request(self, url, response, seconds):
+        """Record one HTTP request to url, answered with response after seconds."""
+        endpoint = endpoint_of(url)
+        status = str(getattr(response, "status_code", "error"))
+        size = _response_bytes(response)
+        bucket = next((f"<={bound}s" for bound in LATENCY_BUCKETS if seconds <= bound),
+                      f">{LATENCY_BUCKETS[-1]}s")
+        with self._lock:
+            stats = self.endpoints.setdefault(endpoint, {
+                "requests": 0, "seconds": 0.0, "max_seconds": 0.0, "bytes": 0,
+                "statuses": {}, "latency": {},
+            })
+            stats["requests"] += 1
+            stats["seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+            stats["bytes"] += size
+            stats["statuses"][status] = stats["statuses"].get(status, 0) + 1
+            stats["latency"][bucket] = stats["latency"].get(bucket, 0) + 1
+
+    def timed(self, send):
+        """Wrap a requests send function (session.get, session.post) so each call is recorded."""
+        def timed_send(url, **kwargs):
+            start = self._clock()
+            response = None
+            try:
+                response = send(url, **kwargs)
+                return response
+            finally:
+                self.record_request(url, response, self._clock() - start)
+        return timed_send
+
+    def report(self, scheduler=None, cache=None, **extra):
+        """Return the run report as a dict; scheduler and cache add rate limit and cache counters."""
+        with self._lock:
+            endpoints = {
+                endpoint: dict(stats, seconds=round(stats["seconds"], 3),
+                               max_seconds=round(stats["max_seconds"], 3))
+                for endpoint, stats in sorted(self.endpoints.items(),
+                                              key=lambda item: -item[1]["requests"])
+            }
+            report = {
+                "finished_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "wall_seconds": round(self._clock() - self._started, 3),
+                "stages": list(self.stages),
+                "requests": sum(stats["requests"] for stats in endpoints.values()),
+                "bytes": sum(stats["bytes"] for stats in endpoints.values()),
+                "endpoints": endpoints,
+            }
+        if scheduler is not None:
+            report["rate_limit"] = {"wait_seconds": round(scheduler.wait_time, 3),
+                                    "retries": scheduler.retries}
+        if cache is not None:
+            report["cache"] = {"hits": cache.hits, "revalidated": cache.revalidated,
+                               "misses": cache.misses, "evictions": cache.evictions}
+        report.update(extra)
+        return report
+
+    def write_report(self, path=RUN_REPORT_PATH, **kwargs):
+        """Write the run report (see report) as JSON to path."""
+        with open(path, "w") as f:
+            json.dump(self.report(**kwargs), f, indent=2)
+        print(f"✓ Saved run report to {path}")
+
+    def print_stages(self):
+        """Print the wall time of each stage."""
+        for entry in self.stages:
+            print(f"  {entry['name']}: {entry['seconds']:.1f}s")
+
+
+# Shared by the whole process; main scripts set metrics.profile from --profile
+metrics = RunMetrics()
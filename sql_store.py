@@ -0,0 +1,188 @@
+"""
+SQLite store of the collected tables for SQL queries
+
+The tables are copied chunk by chunk into one SQLite database, indexed on
+repository, user and date, so questions can be answered with SQL without
+loading the data into pandas. The aggregations of analytics.py are available
+as queries over it too.
+
+Usage:
+    python sql_store.py "SELECT user_login, SUM(prs) FROM daily_rollup GROUP BY user_login"
+    python sql_store.py --tables
+    python sql_store.py --wrapped
+"""
+import calendar
+import os
+import sqlite3
+import sys
+import pandas as pd
+from config import SQL_STORE_PATH, SINCE_DATE, TEAMS
+from records import SCHEMAS, COLUMNS
+from storage import get_storage
+
+SQL_TYPES = {"int": "INTEGER", "string": "TEXT", "datetime": "TEXT"}
+
+# Columns indexed wherever a table has them
+INDEXED_COLUMNS = ("repo_name", "repo_full_name", "user_login", "actor_login", "pr_author",
+                   "created_at", "day")
+
+# Timestamps are stored as ISO 8601 text, like SINCE_DATE, so they compare as strings
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+class SqlStore:
+    """SQLite database holding a copy of the stored tables."""
+
+    def __init__(self, path=SQL_STORE_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+
+    def load(self, table, chunks):
+        """Replace table with the rows of chunks (typed dataframes) and index it."""
+        schema = SCHEMAS[table]
+        columns = COLUMNS[table]
+        self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+        self._conn.execute(f"CREATE TABLE {table} ("
+                           + ", ".join(f"{column} {SQL_TYPES[schema[column]]}" for column in columns)
+                           + ")")
+        insert = f"INSERT INTO {table} VALUES ({', '.join('?' * len(columns))})"
+        for chunk in chunks:
+            chunk = chunk.copy()
+            for column in columns:
+                if schema[column] == "datetime":
+                    chunk[column] = chunk[column].dt.strftime(TIMESTAMP_FORMAT)
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            self._conn.executemany(insert, chunk.itertuples(index=False, name=None))
+        for column in INDEXED_COLUMNS:
+            if column in schema:
+                self._conn.execute(f"CREATE INDEX {table}_{column} ON {table} ({column})")
+        self._conn.commit()
+
+    def query(self, sql, params=()):
+        """Run sql and return its result as a dataframe."""
+        return pd.read_sql_query(sql, self._conn, params=params)
+
+    def rows(self, sql, params=()):
+        """Run sql and return its result rows."""
+        return self._conn.execute(sql, params).fetchall()
+
+    def tables(self):
+        """Return {table: row count} of the tables in the store."""
+        names = [name for (name,) in self.rows(
+            "SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+        return {name: self.rows(f"SELECT COUNT(*) FROM {name}")[0][0] for name in names}
+
+    def close(self):
+        self._conn.close()
+
+
+def update_sql_store(storage=None, path=SQL_STORE_PATH, tables=COLUMNS):
+    """Copy the stored tables (default: every one) into the SQL store, unless it is disabled."""
+    if not path:
+        return
+    storage = storage or get_storage()
+    store = SqlStore(path)
+    try:
+        for table in tables:
+            if storage.exists(table):
+                store.load(table, storage.read_chunks(table))
+    finally:
+        store.close()
+    print(f"✓ Saved {path}")
+
+
+def _team_filter(team, teams=TEAMS):
+    """WHERE clause and parameters selecting the rollup rows of team, as teams.team_dataframes."""
+    if team is None or len(teams) == 1:
+        return "1 = 1", []
+    members = list(team["members"])
+    # Compared as a prefix rather than with LIKE, where _ and % in org names would be wildcards
+    prefix = team["org"] + "/"
+    clause = (f"substr(repo_full_name, 1, ?) = ? AND (pr_author IN ({', '.join('?' * len(members))})"
+              " OR pr_author IS NULL)")
+    return clause, [len(prefix), prefix] + members
+
+
+def _top(store, key, metric, where, params, n):
+    """[(key, total)] of the n largest non-zero totals of metric per key, ties by key."""
+    return store.rows(
+        f"SELECT {key} AS key, SUM({metric}) AS total FROM daily_rollup "
+        f"WHERE {where} AND {key} IS NOT NULL GROUP BY key HAVING total > 0 "
+        f"ORDER BY total DESC, key LIMIT ?", params + [n])
+
+
+def _format_top(rows, template):
+    if not rows:
+        return "N/A"
+    return ", ".join(template.format(key, total) for key, total in rows)
+
+
+def calculate_aggregations_sql(store, team=None, teams=TEAMS):
+    """Calculate the results of analytics.calculate_aggregations with queries over store."""
+    where, params = _team_filter(team, teams)
+    results = {}
+
+    team_repos = (f"SELECT repo_full_name FROM daily_rollup WHERE {where} AND prs > 0"
+                  if team is not None and len(teams) > 1 else None)
+    repos_where, repos_params = (f"full_name IN ({team_repos})", params) if team_repos else ("1 = 1", [])
+    results["total_repos"] = store.rows(
+        f"SELECT COUNT(*) FROM relevant_repos WHERE {repos_where}", repos_params)[0][0]
+    results["new_repos"] = [name for (name,) in store.rows(
+        f"SELECT name FROM relevant_repos WHERE {repos_where} AND created_at > ? ORDER BY rowid",
+        repos_params + [SINCE_DATE])]
+
+    (total_prs, total_comments, lgtm_count, total_commits, additions, deletions, known_stats,
+     workflow_runs, successful_runs, failed_runs) = store.rows(
+        "SELECT COALESCE(SUM(prs), 0), COALESCE(SUM(comments), 0), COALESCE(SUM(lgtm_comments), 0), "
+        "COALESCE(SUM(commits), 0), COALESCE(SUM(additions), 0), COALESCE(SUM(deletions), 0), "
+        "COUNT(additions), COALESCE(SUM(workflow_runs), 0), "
+        "COALESCE(SUM(successful_workflow_runs), 0), COALESCE(SUM(failed_workflow_runs), 0) "
+        f"FROM daily_rollup WHERE {where}", params)[0]
+    results["total_prs"] = total_prs
+
+    # Ties go to the month name that sorts first, as in analytics.calculate_aggregations
+    months = [(calendar.month_name[int(month)], total)
+              for month, total in _top(store, "strftime('%m', day)", "prs", where, params, 12)]
+    results["top_month"] = min(months, key=lambda month: (-month[1], month[0])) if months else (None, 0)
+
+    results["top_3_pr_dates"] = _format_top(_top(store, "date(day)", "prs", where, params, 3), "{}: {}")
+    results["top_5_pr_openers"] = _format_top(_top(store, "user_login", "prs", where, params, 5), "{}: {}")
+    top_repos = _top(store, "repo_name", "prs", where, params, 3)
+    results["top_3_repos"] = _format_top(top_repos, "{}: {} PRs opened")
+    results["most_active_repo"] = top_repos[0] if top_repos else (None, 0)
+    results["top_3_commenters"] = _format_top(
+        _top(store, "user_login", "comments", where, params, 3), "{}: {} comments")
+    results["total_comments"] = total_comments
+    results["lgtm_count"] = lgtm_count
+    results["total_commits"] = total_commits
+    results["total_additions"] = additions if known_stats else "?"
+    results["total_deletions"] = deletions if known_stats else "?"
+    results["total_workflow_runs"] = workflow_runs
+    results["successful_workflow_runs"] = successful_runs
+    results["failed_workflow_runs"] = failed_runs
+    return results
+
+
+def main(args):
+    """Run the command line args: --tables (default), --wrapped or a SQL query."""
+    if not SQL_STORE_PATH or not os.path.exists(SQL_STORE_PATH):
+        print("Error: SQL store not found. Please run data collection first (with SQL_STORE_PATH set).")
+        sys.exit(1)
+    store = SqlStore()
+    if not args or args[0] == "--tables":
+        for table, count in store.tables().items():
+            print(f"{table}: {count} rows")
+    elif args[0] == "--wrapped":
+        from analytics import print_results
+        for team in TEAMS:
+            if len(TEAMS) > 1:
+                print(f"\nTeam {team['name']} ({team['org']})")
+            print_results(calculate_aggregations_sql(store, team))
+    else:
+        with pd.option_context("display.max_rows", 200, "display.width", 200):
+            print(store.query(" ".join(args)))
+    store.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,145 @@
+"""
+Stats daemon: a local server keeping the collected data loaded
+
+Importing pandas and loading the tables takes seconds, answering a query from
+them takes milliseconds. The daemon loads them once and answers stats queries
+over a local (Unix domain) socket, reloading the tables when their
+fingerprints change (see fingerprints.py), e.g. after a collection.
+
+A query is one JSON object per line and is answered with one JSON line,
+{"ok": true, "result": ...} or {"ok": false, "error": ...}:
+    {"query": "ping"}
+    {"query": "teams"}
+    {"query": "wrapped", "team": name}                  the team's stats.json
+    {"query": "user", "login": login, "team": name}     a member's shard
+    {"query": "repo", "repo": name, "team": name}       a repository's shard
+team defaults to the first team. The client side (request) imports no pandas.
+"""
+import json
+import os
+import signal
+import socket
+import socketserver
+import threading
+from config import DAEMON_SOCKET, TEAMS
+
+
+class StatsService:
+    """Answers stats queries from the tables, loaded once and reloaded when they change."""
+
+    def __init__(self, teams=TEAMS):
+        self.teams = teams
+        self._lock = threading.Lock()
+        self._fingerprints = None
+        self._dataframes = None
+        self._answers = {}
+
+    def _data(self):
+        """The loaded (repos, daily rollup) dataframes, reloaded when the stored tables changed."""
+        from analytics import ANALYTICS_COLUMNS, load_dataframes
+        from fingerprints import table_fingerprints
+        from storage import get_storage
+        fingerprints = table_fingerprints(get_storage(), ANALYTICS_COLUMNS)
+        if fingerprints != self._fingerprints:
+            self._dataframes = load_dataframes()
+            self._fingerprints = fingerprints
+            self._answers = {}
+        return self._dataframes
+
+    def _team(self, name):
+        if name is None:
+            return self.teams[0]
+        for team in self.teams:
+            if team["name"] == name:
+                return team
+        raise ValueError(f"Unknown team: {name}")
+
+    def answer(self, request):
+        """Return the result of a query (see the module docstring)."""
+        query = request.get("query")
+        if query == "ping":
+            return "pong"
+        if query == "teams":
+            return self.teams
+        if query not in ("wrapped", "user", "repo"):
+            raise ValueError(f"Unknown query: {query}")
+        key = json.dumps(request, sort_keys=True)
+        with self._lock:
+            dataframes = self._data()
+            if key not in self._answers:
+                self._answers[key] = self._compute(request, dataframes)
+            return self._answers[key]
+
+    def _compute(self, request, dataframes):
+        from analytics import calculate_aggregations
+        from generate_web_stats import build_web_stats, member_web_stats, repo_web_stats
+        from teams import team_dataframes
+        team = self._team(request.get("team"))
+        repos_df, rollup_df = team_dataframes(team, *dataframes, teams=self.teams)
+        query = request["query"]
+        if query == "wrapped":
+            return build_web_stats(calculate_aggregations(repos_df, rollup_df), len(team["members"]))
+        if query == "user":
+            return member_web_stats(repos_df, rollup_df[rollup_df["user_login"] == request["login"]])
+        matches = repos_df.loc[(repos_df["name"] == request["repo"]) | (repos_df["full_name"] == request["repo"]),
+                               "full_name"]
+        if matches.empty:
+            raise ValueError(f"Unknown repository: {request['repo']}")
+        full_name = matches.iloc[0]
+        return repo_web_stats(repos_df, full_name, rollup_df[rollup_df["repo_full_name"] == full_name])
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = {"ok": True, "result": self.server.service.answer(json.loads(line))}
+            except Exception as e:
+                response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            # Counts computed by pandas may be numpy integers
+            self.wfile.write((json.dumps(response, default=int) + "\n").encode())
+
+
+def serve(path=DAEMON_SOCKET, service=None):
+    """Load the data and answer queries on the socket at path until interrupted."""
+    if not hasattr(socket, "AF_UNIX"):
+        raise RuntimeError("The stats daemon needs Unix domain sockets, which this platform lacks")
+    if os.path.exists(path):
+        if request({"query": "ping"}, path) is not None:
+            raise RuntimeError(f"A stats daemon is already running on {path}")
+        # Left behind by a daemon that was killed
+        os.remove(path)
+    service = service or StatsService()
+    print("Loading collected data...")
+    service.answer({"query": "wrapped"})
+    server = socketserver.ThreadingUnixStreamServer(path, _Handler)
+    server.daemon_threads = True
+    server.service = service
+    print(f"✓ Serving stats on {path} (Ctrl+C to stop)")
+    # Stopped like Ctrl+C when terminated, so the socket is removed
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(path)
+
+
+def request(query, path=DAEMON_SOCKET, timeout=30):
+    """Send query (a dict) to the daemon at path and return its result, or None when none is running."""
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(path):
+        return None
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        try:
+            connection.connect(path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            return None
+        connection.sendall((json.dumps(query) + "\n").encode())
+        with connection.makefile("rb") as lines:
+            response = json.loads(lines.readline())
+    if not response["ok"]:
+        raise RuntimeError(response["error"])
+    return response["result"]
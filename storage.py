@@ -0,0 +1,174 @@
+"""
+Storage backends for the collected tables
+
+Both backends store the typed schemas from records.py and return dataframes
+with the same dtypes. Parquet (requires pyarrow) is compressed and columnar,
+so reads only touch the requested columns; CSV needs no extra dependency.
+"""
+import csv
+import os
+import pandas as pd
+from config import STORAGE_FORMAT, DATA_DIR, CHUNK_SIZE
+from records import SCHEMAS, COLUMNS, KEYS
+
+PANDAS_DTYPES = {"int": "Int64", "string": "string"}
+
+
+def apply_schema(df, table, columns=None):
+    """Return df restricted to columns (default: all) of table, cast to the table schema."""
+    schema = SCHEMAS[table]
+    columns = columns or COLUMNS[table]
+    df = df.reindex(columns=columns)
+    for column in columns:
+        kind = schema[column]
+        if kind == "datetime":
+            df[column] = pd.to_datetime(df[column], utc=True, errors="coerce",
+                                        format="ISO8601").astype("datetime64[us, UTC]")
+        else:
+            df[column] = df[column].astype(PANDAS_DTYPES[kind])
+    return df
+
+
+class CsvStorage:
+    """Tables stored as <table>.csv files."""
+
+    extension = "csv"
+
+    def __init__(self, directory=DATA_DIR):
+        self.directory = directory
+
+    def path(self, table):
+        """Path of the file holding table."""
+        return os.path.join(self.directory, f"{table}.{self.extension}")
+
+    def exists(self, table):
+        """Whether table has been written."""
+        return os.path.exists(self.path(table))
+
+    def read(self, table, columns=None):
+        """Read table (only columns, when given) as a typed dataframe."""
+        return self.read_path(self.path(table), table, columns)
+
+    def read_path(self, path, table, columns=None):
+        # Columns missing from files written by older versions come back empty
+        usecols = (lambda column: column in columns) if columns else None
+        try:
+            df = pd.read_csv(path, usecols=usecols, dtype="string")
+        except pd.errors.EmptyDataError:
+            df = pd.DataFrame()
+        return apply_schema(df, table, columns)
+
+    def read_chunks(self, table, chunk_size=CHUNK_SIZE):
+        """Yield table as typed dataframes of at most chunk_size rows."""
+        try:
+            chunks = pd.read_csv(self.path(table), dtype="string", chunksize=chunk_size)
+            for chunk in chunks:
+                yield apply_schema(chunk, table)
+        except pd.errors.EmptyDataError:
+            return
+
+    def write(self, table, df):
+        """Replace table with df."""
+        tmp_path = self.path(table) + ".tmp"
+        apply_schema(df, table).to_csv(tmp_path, index=False)
+        os.replace(tmp_path, self.path(table))
+
+    def chunk_writer(self, path, table):
+        """Return a writer appending chunks of records of table to path."""
+        return CsvChunkWriter(path, table)
+
+
+class CsvChunkWriter:
+    """Appends chunks of records (tuples of the table's column values, see records.py) to a CSV file."""
+
+    def __init__(self, path, table):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(COLUMNS[table])
+
+    def write(self, records):
+        self._writer.writerows(records)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetStorage(CsvStorage):
+    """Tables stored as zstd compressed <table>.parquet files."""
+
+    extension = "parquet"
+
+    def read_path(self, path, table, columns=None):
+        if columns:
+            import pyarrow.parquet as pq
+            stored = set(pq.read_schema(path).names)
+            return apply_schema(pd.read_parquet(path, columns=[c for c in columns if c in stored]),
+                                table, columns)
+        return apply_schema(pd.read_parquet(path), table, columns)
+
+    def read_chunks(self, table, chunk_size=CHUNK_SIZE):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(self.path(table)).iter_batches(batch_size=chunk_size):
+            yield apply_schema(batch.to_pandas(), table)
+
+    def write(self, table, df):
+        tmp_path = self.path(table) + ".tmp"
+        apply_schema(df, table).to_parquet(tmp_path, index=False, compression="zstd",
+                                           schema=arrow_schema(table))
+        os.replace(tmp_path, self.path(table))
+
+    def chunk_writer(self, path, table):
+        return ParquetChunkWriter(path, table)
+
+
+class ParquetChunkWriter:
+    """Writes each chunk of records (tuples of the table's column values) as a row group of a Parquet file."""
+
+    def __init__(self, path, table):
+        import pyarrow.parquet as pq
+        self.table = table
+        self.schema = arrow_schema(table)
+        self._writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+
+    def write(self, records):
+        import pyarrow as pa
+        df = apply_schema(pd.DataFrame.from_records(records, columns=COLUMNS[self.table]), self.table)
+        self._writer.write_table(pa.Table.from_pandas(df, schema=self.schema, preserve_index=False))
+
+    def close(self):
+        self._writer.close()
+
+
+def arrow_schema(table):
+    """Arrow schema of table."""
+    import pyarrow as pa
+    types = {"int": pa.int64(), "string": pa.string(), "datetime": pa.timestamp("us", tz="UTC")}
+    return pa.schema([(column, types[kind]) for column, kind in SCHEMAS[table].items()])
+
+
+def get_storage(storage_format=STORAGE_FORMAT, directory=DATA_DIR):
+    """Return the storage backend for storage_format ("parquet", "csv" or "auto")."""
+    if storage_format == "auto":
+        try:
+            import pyarrow  # noqa: F401
+            storage_format = "parquet"
+        except ImportError:
+            storage_format = "csv"
+    if storage_format == "parquet":
+        return ParquetStorage(directory)
+    if storage_format == "csv":
+        return CsvStorage(directory)
+    raise ValueError(f"Unknown STORAGE_FORMAT: {storage_format}")
+
+
+def read_table(table, columns=None, storage=None):
+    """Read a saved table as a typed dataframe, only loading columns when given."""
+    return (storage or get_storage()).read(table, columns)
+
+
+def merge_tables(storage, table, new_df):
+    """Merge new_df into the stored table, keeping the newest row per key."""
+    existing = storage.read(table)
+    merged = pd.concat([existing, apply_schema(new_df, table)], ignore_index=True)
+    return merged.drop_duplicates(subset=KEYS[table], keep="last").reset_index(drop=True)
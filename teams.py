@@ -0,0 +1,55 @@
+"""
+Teams and organizations collected in one run
+
+Every organization is crawled once, keeping the pull requests of the members
+of all its teams; the numbers of each team are then derived from the shared
+tables rather than collected again.
+"""
+import re
+from config import TEAMS
+
+
+def members_by_org(teams=TEAMS):
+    """Return {org: set of members of all its teams}, in the order orgs first appear."""
+    orgs = {}
+    for team in teams:
+        orgs.setdefault(team["org"], set()).update(team["members"])
+    return orgs
+
+
+def slug(name):
+    """name made safe for a file name (web/script.js builds the same names)."""
+    return re.sub(r"[^A-Za-z0-9_.-]+", "-", name)
+
+
+def stats_filename(team, teams=TEAMS):
+    """Name of the web stats file of team: stats.json for the first team, stats-<name>.json otherwise."""
+    if team is teams[0]:
+        return "stats.json"
+    return f"stats-{slug(team['name'])}.json"
+
+
+def shards_dirname(team, teams=TEAMS):
+    """Name of the web directory of team's member and repository stats: shards, or shards-<name>."""
+    if team is teams[0]:
+        return "shards"
+    return f"shards-{slug(team['name'])}"
+
+
+def team_dataframes(team, repos_df, rollup_df, teams=TEAMS):
+    """Return the repositories and daily rollup (see analytics.load_dataframes) restricted to team.
+
+    Rollup rows are kept when they belong to pull requests of the team's
+    members in its organization; workflow runs, which have no pull request,
+    are counted per organization. With a single team the collected tables
+    already are the team's and are returned unchanged.
+    """
+    if len(teams) == 1:
+        return repos_df, rollup_df
+
+    in_org = rollup_df["repo_full_name"].str.startswith(team["org"] + "/", na=False)
+    by_team = rollup_df["pr_author"].isin(team["members"]) | rollup_df["pr_author"].isna()
+    rollup_df = rollup_df[in_org & by_team]
+    team_repos = rollup_df.loc[rollup_df["prs"] > 0, "repo_full_name"]
+    repos_df = repos_df[repos_df["full_name"].isin(team_repos)]
+    return repos_df, rollup_df
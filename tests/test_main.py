@@ -0,0 +1,19 @@
+import json
+import pandas as pd
+from config import TEAMS
+from main import write_team_outputs
+from storage import apply_schema
+
+
+def test_team_outputs_write_the_team_index(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "web").mkdir()
+    dataframes = (apply_schema(pd.DataFrame(), "relevant_repos", ["name", "full_name", "created_at"]),
+                  apply_schema(pd.DataFrame(), "daily_rollup"))
+
+    write_team_outputs(dataframes)
+
+    with open(tmp_path / "web" / "team-files.json") as f:
+        team_files = json.load(f)
+    assert team_files[TEAMS[0]["name"]] == {"stats": "stats.json", "shards": "shards"}
+    assert (tmp_path / "web" / "stats.json").exists()
@@ -0,0 +1,30 @@
+from text_metrics import TEXT_METRIC_COLUMNS, text_metrics
+
+
+def test_empty_body():
+    assert text_metrics(None) == dict.fromkeys(TEXT_METRIC_COLUMNS, 0)
+
+
+def test_timestamps_are_not_shortcodes():
+    assert text_metrics("Deployed at 10:30:00 UTC")["emojis"] == 0
+
+
+def test_double_colon_paths_are_not_shortcodes():
+    assert text_metrics("see foo::bar::baz")["emojis"] == 0
+    assert text_metrics("sha 1a2b:3c4d:5e6f")["emojis"] == 0
+
+
+def test_shortcodes_and_emoji_are_counted():
+    assert text_metrics(":tada: shipped :+1: 🚀")["emojis"] == 3
+
+
+def test_lgtm_shortcode_counts_for_both_metrics():
+    metrics = text_metrics(":lgtm:")
+    assert metrics["lgtm"] == 1
+    assert metrics["emojis"] == 1
+
+
+def test_shipit_shortcode_is_an_approval():
+    metrics = text_metrics(":shipit:")
+    assert metrics["approval"] == 1
+    assert metrics["emojis"] == 1
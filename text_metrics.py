@@ -0,0 +1,39 @@
+"""
+Text metrics of comment bodies
+
+The metrics are computed when a comment is collected and stored as columns
+of the comments table. Each pattern is searched on its own, so text matched
+by one metric (say the :lgtm: shortcode) still counts for the others.
+"""
+import re
+
+# Metric -> pattern; a comment scores 1 for a metric when the pattern occurs in it
+TEXT_PATTERNS = {
+    "lgtm": r"lgtm|looks good",
+    "approval": r"\bapprov(?:e|ed|ing)\b|\bship ?it\b|:shipit:",
+    "thanks": r"\bthank(?:s| you)?\b|\bthx\b",
+    "nit": r"\bnit(?:pick)?s?\b",
+    "question": r"\?(?=\s|$)",
+    # Counted rather than flagged: emoji characters and :shortcode: emoji. A
+    # shortcode stands on its own, unlike the colons of 10:30:00 or foo::bar
+    "emojis": r"[\U0001F300-\U0001FAFF\u2600-\u27BF]|(?<![\w:]):(?:[a-z][a-z0-9_+-]*|[+-]1):(?![\w:])",
+}
+
+COUNTED_METRICS = ("emojis",)
+
+_PATTERNS = {name: re.compile(pattern, re.IGNORECASE) for name, pattern in TEXT_PATTERNS.items()}
+
+# Columns added to each comment record
+TEXT_METRIC_COLUMNS = ["body_length"] + list(TEXT_PATTERNS)
+
+
+def text_metrics(body):
+    """Return {column: value} of the text metrics of a comment body (which may be None)."""
+    body = body or ""
+    metrics = {"body_length": len(body)}
+    for name, pattern in _PATTERNS.items():
+        if name in COUNTED_METRICS:
+            metrics[name] = sum(1 for _ in pattern.finditer(body))
+        else:
+            metrics[name] = 1 if pattern.search(body) else 0
+    return metrics
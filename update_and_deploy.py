@@ -2,28 +2,44 @@
 """
 Helper script to update and deploy GitHub Team Wrapped to GitHub Pages
 
-This script will:
-1. Collect fresh data from GitHub API
-2. Generate updated stats.json
-3. Copy to docs/ folder for GitHub Pages
-4. Commit and push changes to deploy
+This script runs these stages in one process (see pipeline.py), handing the
+tables between them in memory:
+1. collect: Collect fresh data from GitHub API
+2. stats: Load the collected tables
+3. derive: Calculate the statistics of every team
+4. render: Generate updated stats.json (and the member and repository stats)
+5. publish: Copy to docs/ folder for GitHub Pages, commit and push to deploy
+
+Stages whose inputs are unchanged since the last run (by content hash) are
+skipped, so a night without new data reloads, renders and commits nothing.
 
 Usage:
     python update_and_deploy.py
     
 Options:
-    --skip-collection: Skip data collection, only regenerate stats from existing CSVs
+    --skip-collection: Skip data collection, only regenerate stats from existing data files
+    --incremental: Only collect data newer than the last run and merge it into the data files
+    --graphql: Collect pull requests, comments and commits with the GraphQL API
+    --profile: Profile every collection stage with cProfile (see run_report.json)
     --no-push: Generate and stage changes but don't push to GitHub
+    --force: Run every stage, even those whose inputs are unchanged
 """
 
 import sys
 import os
 import subprocess
-import shutil
+import glob
 from datetime import datetime
+from config import COLLECTION_BACKEND, SINCE_DATE, TEAMS
+from analytics import ANALYTICS_COLUMNS, load_dataframes, calculate_aggregations
+from data_collection import run_collection, write_run_report
+from generate_web_stats import TEAM_FILES, generate_stats_json, generate_shards, generate_team_files
+from fingerprints import sync, table_fingerprints
+from pipeline import Pipeline, Stage
+from run_metrics import metrics
+from storage import get_storage
+from teams import team_dataframes, stats_filename, shards_dirname
 
-# Get the Python executable path from the current environment
-PYTHON_CMD = sys.executable
 
 def run_command(command, description):
     """Run a shell command and handle errors"""
@@ -41,77 +57,117 @@ def run_command(command, description):
             print(e.stderr)
         return False
 
-def main():
-    skip_collection = '--skip-collection' in sys.argv
-    no_push = '--no-push' in sys.argv
-    
-    print("\n" + "="*60)
-    print("🚀 GitHub Team Wrapped - Update & Deploy")
-    print("="*60)
-    print(f"📅 Running at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    
-    # Step 1: Collect data from GitHub (unless skipped)
+
+def web_outputs():
+    """Names of the files and directories of web/ rendered for the teams."""
+    return [stats_filename(team) for team in TEAMS] + [shards_dirname(team) for team in TEAMS] + [TEAM_FILES]
+
+
+def collect(skip_collection, incremental, backend):
+    """Collect data from GitHub (unless skipped); return the run's job journal."""
     if skip_collection:
-        print("\n⏭️  Skipping data collection (using existing CSV files)")
-    else:
-        print("\n📊 Step 1/5: Collecting data from GitHub API...")
-        if not run_command(f'"{PYTHON_CMD}" data_collection.py', "Fetching data from GitHub"):
-            print("\n❌ Data collection failed. Exiting.")
-            return False
-    
-    # Step 2: Generate stats.json for web
-    print("\n📈 Step 2/5: Generating web statistics...")
-    if not run_command(f'"{PYTHON_CMD}" generate_web_stats.py', "Creating stats.json"):
-        print("\n❌ Stats generation failed. Exiting.")
-        return False
-    
-    # Step 3: Copy stats.json to docs folder
-    print("\n📁 Step 3/5: Copying stats to docs folder...")
-    try:
-        shutil.copy('web/stats.json', 'docs/stats.json')
-        print("✅ Copied web/stats.json → docs/stats.json")
-    except Exception as e:
-        print(f"❌ Failed to copy stats: {e}")
-        return False
-    
-    # Step 4: Git add and commit
-    print("\n💾 Step 4/5: Committing changes...")
-    
-    # Check if there are changes
-    result = subprocess.run("git status --porcelain", shell=True, capture_output=True, text=True)
+        print("⏭️  Skipping data collection (using existing data files)")
+        return None
+    return run_collection(incremental, backend)
+
+
+def derive(stats):
+    """Return [(team, team dataframes, results)] of every team from the loaded tables."""
+    derived = []
+    for team in TEAMS:
+        team_frames = team_dataframes(team, *stats)
+        derived.append((team, team_frames, calculate_aggregations(*team_frames)))
+    return derived
+
+
+def render(derive):
+    """Write the stats files and member/repository shards of every team to web/; return the changed files."""
+    changed = []
+    for team, team_frames, results in derive:
+        generate_stats_json(results, team)
+        changed.extend(generate_shards(team, *team_frames))
+    if generate_team_files():
+        changed.append(os.path.join("web", TEAM_FILES))
+    return changed
+
+
+def publish(push):
+    """Copy the changed stats to docs/, commit them and push unless push is False."""
+    names = [os.path.basename(path) for path in
+             sorted(glob.glob('web/stats*.json')) + sorted(glob.glob('web/shards*')) + glob.glob(f'web/{TEAM_FILES}')]
+    copied = []
+    for name in names:
+        copied.extend(sync(f'web/{name}', f'docs/{name}'))
+    print(f"✅ Copied {len(copied)} changed files from web/ to docs/")
+
+    # Check if there are changes, only among the published files
+    stats_paths = " ".join(f"docs/{name} web/{name}" for name in names)
+    result = subprocess.run(f"git status --porcelain -- {stats_paths}", shell=True, capture_output=True, text=True)
     if not result.stdout.strip():
         print("ℹ️  No changes to commit. Stats are already up to date!")
-        return True
-    
-    # Stage changes (only docs/stats.json and web/stats.json, not CSVs which are gitignored)
-    if not run_command("git add docs/stats.json web/stats.json", "Staging updated files"):
-        print("\n❌ Git add failed. Exiting.")
-        return False
-    
+        return
+
+    # Stage changes (only the stats files, not data files which are gitignored), removals included
+    if not run_command(f"git add -A -- {stats_paths}", "Staging updated files"):
+        raise RuntimeError("git add failed")
+
     # Commit with timestamp
     commit_msg = f"Update stats - {datetime.now().strftime('%Y-%m-%d %H:%M')}"
     if not run_command(f'git commit -m "{commit_msg}"', "Creating commit"):
-        print("\n❌ Git commit failed. Exiting.")
-        return False
-    
-    # Step 5: Push to GitHub (unless --no-push)
-    if no_push:
+        raise RuntimeError("git commit failed")
+
+    if not push:
         print("\n⏸️  Skipping push (--no-push flag set)")
         print("✅ Changes are committed locally. Run 'git push' when ready.")
-    else:
-        print("\n🚀 Step 5/5: Pushing to GitHub...")
-        if not run_command("git push", "Deploying to GitHub Pages"):
-            print("\n❌ Git push failed. You may need to push manually.")
-            return False
-        
-        print("\n" + "="*60)
-        print("✅ SUCCESS! Your GitHub Team Wrapped has been updated!")
-        print("="*60)
-        print("\n🌐 Your live site will update in 1-2 minutes:")
-        print("   https://mitanuriel.github.io/GitHubWrapped/")
-        print("\n💡 Tip: Clear your browser cache if changes don't appear immediately")
+        return
+    if not run_command("git push", "Deploying to GitHub Pages"):
+        raise RuntimeError("git push failed, you may need to push manually")
+
+    print("\n" + "="*60)
+    print("✅ SUCCESS! Your GitHub Team Wrapped has been updated!")
+    print("="*60)
+    print("\n🌐 Your live site will update in 1-2 minutes:")
+    print("   https://mitanuriel.github.io/GitHubWrapped/")
+    print("\n💡 Tip: Clear your browser cache if changes don't appear immediately")
+
+
+def build_pipeline(skip_collection=False, incremental=False, backend=COLLECTION_BACKEND, push=True):
+    """The stages of an update: collect, stats, derive, render and publish."""
+    storage = get_storage()
+    return Pipeline([
+        # Collection times its own steps, and always runs: only GitHub knows what is new
+        Stage("collect", lambda: collect(skip_collection, incremental, backend), always=True, timed=False),
+        Stage("stats", load_dataframes, after=["collect"],
+              fingerprint=lambda: table_fingerprints(storage, ANALYTICS_COLUMNS)),
+        Stage("derive", derive, inputs=["stats"], fingerprint=lambda: {"teams": TEAMS, "since": SINCE_DATE}),
+        Stage("render", render, inputs=["derive"],
+              outputs=lambda: all(os.path.exists(os.path.join("web", name)) for name in web_outputs())),
+        Stage("publish", lambda: publish(push), after=["render"], fingerprint=lambda: {"push": push},
+              outputs=lambda: all(os.path.exists(os.path.join("docs", name)) for name in web_outputs())),
+    ])
+
+
+def main(argv=None):
+    """Run the update with the options of argv (default: the command line); return whether it succeeded."""
+    argv = sys.argv if argv is None else argv
+    skip_collection = '--skip-collection' in argv
+    no_push = '--no-push' in argv
+    incremental = '--incremental' in argv
+    backend = "graphql" if '--graphql' in argv else COLLECTION_BACKEND
+    metrics.profile = '--profile' in argv
     
-    return True
+    print("\n" + "="*60)
+    print("🚀 GitHub Team Wrapped - Update & Deploy")
+    print("="*60)
+    print(f"📅 Running at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    pipeline = build_pipeline(skip_collection, incremental, backend, push=not no_push)
+    success = pipeline.run(force=pipeline.stages if '--force' in argv else ())
+    if success and "publish" in pipeline.skipped:
+        print("\nℹ️  No changes to publish. Stats are already up to date!")
+    write_run_report(pipeline.values.get("collect"))
+    return success
+
 
 if __name__ == "__main__":
     print("\n")
@@ -3,10 +3,80 @@ let currentSlide = 0;
 let stats = null;
 const totalSlides = 10;
 
+let shardIndexLoaded = false;
+const params = new URLSearchParams(window.location.search);
+
+// Name made safe for a file name, as teams.slug does
+function slug(name) {
+  return name.replace(/[^A-Za-z0-9_.-]+/g, '-');
+}
+
+// Stats file and shards directory of each team by name, from team-files.json
+let teamFiles = {};
+
+async function loadTeamFiles() {
+  if (!params.get('team')) return;
+  try {
+    const response = await fetch('team-files.json');
+    if (response.ok) teamFiles = await response.json();
+  } catch (error) {
+    console.error('Error loading team files:', error);
+  }
+}
+
+// Directory of the member and repository stats of the team in ?team=<name>
+function shardsDir() {
+  const team = params.get('team');
+  if (!team) return 'shards';
+  return teamFiles[team] ? teamFiles[team].shards : `shards-${slug(team)}`;
+}
+
+// Stats file of the page: a member (?user=<login>), a repository (?repo=<name>)
+// or the team (?team=<name>, stats.json when absent)
+function statsFile() {
+  if (params.get('user')) return `${shardsDir()}/users/${slug(params.get('user'))}.json`;
+  if (params.get('repo')) return `${shardsDir()}/repos/${slug(params.get('repo'))}.json`;
+  const team = params.get('team');
+  if (!team) return 'stats.json';
+  return teamFiles[team] ? teamFiles[team].stats : `stats-${slug(team)}.json`;
+}
+
+// Url of the page of a member or repository (or of the team when neither is given)
+function drilldownUrl(key, value) {
+  const next = new URLSearchParams();
+  if (params.get('team')) next.set('team', params.get('team'));
+  if (key) next.set(key, value);
+  const query = next.toString();
+  return query ? `?${query}` : window.location.pathname;
+}
+
+// Fill the member and repository pickers from the shard index, only once the summary is reached
+async function loadShardIndex() {
+  if (shardIndexLoaded) return;
+  shardIndexLoaded = true;
+  try {
+    const response = await fetch(`${shardsDir()}/index.json`);
+    const index = await response.json();
+    const pickers = [['member-select', 'user', index.users, 'login'], ['repo-select', 'repo', index.repos, 'name']];
+    pickers.forEach(([id, key, entries, field]) => {
+      const select = document.getElementById(id);
+      entries.forEach((entry) => {
+        select.add(new Option(`${entry[field]} (${entry.total_prs} PRs)`, entry[field]));
+      });
+      select.addEventListener('change', () => {
+        if (select.value) window.location.href = drilldownUrl(key, select.value);
+      });
+    });
+    document.getElementById('drilldown').hidden = false;
+  } catch (error) {
+    console.error('Error loading member and repository index:', error);
+  }
+}
+
 // Load stats from JSON file
 async function loadStats() {
   try {
-    const response = await fetch('stats.json');
+    const response = await fetch(statsFile());
     stats = await response.json();
     console.log('Stats loaded:', stats);
     return stats;
@@ -119,6 +189,7 @@ function populateSlideData(slideIndex) {
       animateNumber('summary-commits', stats.total_commits, '');
       animateNumber('summary-comments', stats.total_comments, '');
       animateNumber('summary-workflows', stats.total_workflow_runs, '');
+      loadShardIndex();
       break;
   }
 }
@@ -199,9 +270,19 @@ document.addEventListener('DOMContentLoaded', async () => {
   console.log('Page loaded, loading stats...');
 
   // Load stats first
+  await loadTeamFiles();
   await loadStats();
   console.log('Stats loaded successfully:', stats);
 
+  // Member and repository pages are titled after them and link back to the team
+  const subject = params.get('user') || params.get('repo');
+  if (subject) {
+    document.querySelector('.title').textContent = `${subject} Wrapped`;
+    const teamLink = document.getElementById('team-link');
+    teamLink.href = drilldownUrl();
+    teamLink.hidden = false;
+  }
+
   // Start button
   const startBtn = document.getElementById('start-btn');
   if (startBtn) {
@@ -0,0 +1,384 @@
+"""
+Webhook ingestion: near real time updates of the collected tables
+
+A local HTTP endpoint receives the GitHub webhook deliveries of the
+organizations (pull_request, issue_comment, pull_request_review_comment, push
+and workflow_run events), projects their payloads with records.py into rows
+of the same tables the collection writes, and applies them in small batches:
+changed rows are upserted by key and the daily rollup is updated
+incrementally (see rollups.update_rollup_incrementally) instead of rebuilt.
+The stats daemon picks the changes up on its next query.
+
+Webhooks can miss deliveries, and pushes carry no changed line counts, so the
+API stays the reference: every WEBHOOK_RECONCILE_HOURS the endpoint runs an
+incremental collection, which merges whatever the events missed.
+
+Received events are recorded to WEBHOOK_LOG_PATH, one JSON object per line
+({"event", "delivery", "payload"}); replaying a recording applies its events
+again (applying an event twice changes nothing).
+
+Usage:
+    python webhooks.py
+    python webhooks.py --replay webhook_events.jsonl
+"""
+import hashlib
+import hmac
+import json
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+import pandas as pd
+from config import (
+    CHUNK_SIZE, COLLECTION_BACKEND, GITHUB_API_URL, GITHUB_TOKEN, SINCE_DATE, TEAMS,
+    WEBHOOK_BATCH_SECONDS, WEBHOOK_HOST, WEBHOOK_LOG_PATH, WEBHOOK_PORT, WEBHOOK_RECONCILE_HOURS,
+    WEBHOOK_SECRET, WEBHOOK_STATE_PATH,
+)
+from records import COLUMNS, KEYS, project_comment, project_commit, project_pr, project_repo, project_run
+from rollups import ROLLUP_SOURCES, update_rollup_incrementally
+from sql_store import update_sql_store
+from storage import apply_schema, get_storage, read_table
+from teams import members_by_org
+
+# Events applied to the tables, others are acknowledged and ignored
+EVENTS = ("pull_request", "issue_comment", "pull_request_review_comment", "push", "workflow_run")
+
+
+def valid_signature(body, signature, secret=WEBHOOK_SECRET):
+    """Whether signature (the X-Hub-Signature-256 header) signs body with secret."""
+    expected = "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature or "")
+
+
+def parse_payload(body, content_type):
+    """Payload of a delivery sent as application/json or application/x-www-form-urlencoded."""
+    if content_type and content_type.startswith("application/x-www-form-urlencoded"):
+        form = parse_qs(body.decode())
+        if "payload" not in form:
+            raise ValueError("Form delivery without a payload")
+        return json.loads(form["payload"][0])
+    return json.loads(body)
+
+
+class WebhookIngester:
+    """Applies webhook events of the team to the stored tables and the daily rollup.
+
+    Like the collection, it keeps the pull requests of team members created
+    since SINCE_DATE, the comments and commits of those pull requests (pushes
+    are matched to them by branch) and the workflow runs of the repositories
+    they are in. The branches of open team pull requests come from the stored
+    pull requests and the pull request events since, kept in state_path
+    between runs.
+    """
+
+    def __init__(self, storage=None, teams=TEAMS, state_path=WEBHOOK_STATE_PATH):
+        self.storage = storage or get_storage()
+        self.org_members = members_by_org(teams)
+        self.state_path = state_path
+        # "<owner>/<repo>:<branch>" -> id of the open team pull request from it
+        self.branches = {}
+        if state_path and os.path.exists(state_path):
+            with open(state_path) as f:
+                self.branches = json.load(f)["branches"]
+        self.reload()
+
+    def reload(self):
+        """Read the team pull requests and their repositories from the stored tables."""
+        self.prs = {}
+        self.repos = set()
+        if self.storage.exists("relevant_prs"):
+            prs = read_table("relevant_prs", ["id", "number", "state", "repo_full_name", "head_ref",
+                                              "head_repo_full_name"], self.storage)
+            self.prs = dict(zip(zip(prs["repo_full_name"], prs["number"]), prs["id"]))
+            # Pull request events seen since the collection know better than the stored state
+            open_prs = prs[(prs["state"] == "open").fillna(False) & prs["head_ref"].notna()]
+            head_repos = open_prs["head_repo_full_name"].fillna(open_prs["repo_full_name"])
+            for head_repo, ref, pr_id in zip(head_repos, open_prs["head_ref"], open_prs["id"]):
+                self.branches.setdefault(f"{head_repo}:{ref}", int(pr_id))
+        if self.storage.exists("relevant_repos"):
+            self.repos = set(read_table("relevant_repos", ["full_name"], self.storage)["full_name"])
+
+    def normalize(self, event, payload):
+        """Return the changes event makes to the tables: {table: {key: record, or None to delete}}."""
+        handler = getattr(self, f"_{event}", None)
+        if handler is None:
+            return {}
+        return handler(payload)
+
+    def _pull_request(self, payload):
+        pr = payload["pull_request"]
+        repo = payload["repository"]
+        members = self.org_members.get(repo["owner"]["login"], ())
+        if pr["user"]["login"] not in members or pr["created_at"] < SINCE_DATE:
+            return {}
+        head_repo = pr["head"].get("repo") or repo
+        branch = f"{head_repo['full_name']}:{pr['head']['ref']}"
+        if pr["state"] == "open":
+            self.branches[branch] = pr["id"]
+        else:
+            self.branches.pop(branch, None)
+        self.prs[(repo["full_name"], pr["number"])] = pr["id"]
+        self.repos.add(repo["full_name"])
+        return {"relevant_prs": {pr["id"]: project_pr(pr)}, "relevant_repos": {repo["id"]: project_repo(repo)}}
+
+    def _comment(self, payload, number):
+        pr_id = self.prs.get((payload["repository"]["full_name"], number))
+        if pr_id is None:
+            return {}
+        comment = payload["comment"]
+        record = None if payload.get("action") == "deleted" else project_comment(comment, pr_id)
+        return {"relevant_prs_comments": {comment["id"]: record}}
+
+    def _issue_comment(self, payload):
+        # Pull requests are issues too, other issues are not collected
+        if "pull_request" not in payload["issue"]:
+            return {}
+        return self._comment(payload, payload["issue"]["number"])
+
+    def _pull_request_review_comment(self, payload):
+        return self._comment(payload, payload["pull_request"]["number"])
+
+    def _push(self, payload):
+        repo_name = payload["repository"]["full_name"]
+        pr_id = self.branches.get(f"{repo_name}:{payload['ref'].removeprefix('refs/heads/')}")
+        if pr_id is None:
+            return {}
+        commits = {}
+        for commit in payload["commits"]:
+            author = commit.get("author") or {}
+            committer = commit.get("committer") or {}
+            # Shaped like an entry of the pull request's commit list
+            record = project_commit({
+                "sha": commit["id"],
+                "commit": {
+                    "url": f"{GITHUB_API_URL}/repos/{repo_name}/git/commits/{commit['id']}",
+                    "message": commit.get("message"),
+                    "author": {"name": author.get("name"), "date": commit.get("timestamp")},
+                    "committer": {"name": committer.get("name"), "date": commit.get("timestamp")},
+                },
+                "author": {"login": author["username"]} if author.get("username") else None,
+            }, pr_id)
+            commits[record.url] = record
+        return {"relevant_prs_commits": commits}
+
+    def _workflow_run(self, payload):
+        run = payload["workflow_run"]
+        repo = payload["repository"]
+        if repo["full_name"] not in self.repos or run["created_at"] < SINCE_DATE:
+            return {}
+        return {"workflow_runs": {run["id"]: project_run(dict(run, repository=repo))}}
+
+    def apply(self, changes):
+        """Write changes (as returned by normalize) to the tables, the rollup and the SQL store.
+
+        Returns {table: number of rows upserted or deleted}.
+        """
+        removed, added = {}, {}
+        for table, rows in changes.items():
+            if not rows:
+                continue
+            if self.storage.exists(table):
+                existing = self.storage.read(table)
+            else:
+                existing = apply_schema(pd.DataFrame(), table)
+            replaced = existing[KEYS[table]].isin(list(rows))
+            removed[table] = existing[replaced]
+            records = [record for record in rows.values() if record is not None]
+            added[table] = apply_schema(pd.DataFrame.from_records(records, columns=COLUMNS[table]), table)
+            kept = [df for df in (existing[~replaced], added[table]) if not df.empty]
+            self.storage.write(table, pd.concat(kept, ignore_index=True) if kept else existing.iloc[:0])
+        if not added:
+            return {}
+        prs = (read_table("relevant_prs", ROLLUP_SOURCES["relevant_prs"], self.storage)
+               if self.storage.exists("relevant_prs") else apply_schema(pd.DataFrame(), "relevant_prs"))
+        update_rollup_incrementally(self.storage, removed, added, prs)
+        update_sql_store(self.storage, tables=list(added) + ["daily_rollup"])
+        self._save_state()
+        return {table: len(changes[table]) for table in added}
+
+    def ingest(self, events):
+        """Apply events, a list of (event name, payload), in order; return the rows changed per table."""
+        changes = {}
+        for event, payload in events:
+            for table, rows in self.normalize(event, payload).items():
+                changes.setdefault(table, {}).update(rows)
+        counts = self.apply(changes)
+        summary = ", ".join(f"{table} {count}" for table, count in counts.items()) or "no changes"
+        print(f"✓ Applied {len(events)} events: {summary}")
+        return counts
+
+    def _save_state(self):
+        if not self.state_path:
+            return
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"branches": self.branches}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+
+class EventLog:
+    """Recording of the received events, one JSON line per delivery (disabled when path is empty)."""
+
+    def __init__(self, path=WEBHOOK_LOG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, event, delivery, payload):
+        if not self.path:
+            return
+        line = json.dumps({"event": event, "delivery": delivery, "payload": payload})
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def read_recording(path):
+    """Yield the (event name, payload) of the events recorded in path."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                delivery = json.loads(line)
+                yield delivery["event"], delivery["payload"]
+
+
+def replay(paths, ingester=None, batch_size=CHUNK_SIZE):
+    """Apply the events recorded in paths, in batches of batch_size events."""
+    ingester = ingester or WebhookIngester()
+    batch = []
+    for path in paths:
+        for event in read_recording(path):
+            batch.append(event)
+            if len(batch) >= batch_size:
+                ingester.ingest(batch)
+                batch = []
+    if batch:
+        ingester.ingest(batch)
+
+
+def reconcile(ingester, backend=COLLECTION_BACKEND):
+    """Merge what the events missed with an incremental collection, then reload the team's pull requests."""
+    from data_collection import run_collection
+    print("\n🔄 Reconciling with the GitHub API...")
+    run_collection(incremental=True, backend=backend)
+    ingester.reload()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.server.secret and not valid_signature(body, self.headers.get("X-Hub-Signature-256"),
+                                                      self.server.secret):
+            return self._reply(401, "Invalid signature")
+        event = self.headers.get("X-GitHub-Event")
+        if event == "ping":
+            return self._reply(200, "pong")
+        if event not in EVENTS:
+            return self._reply(202, f"Ignored {event} event")
+        try:
+            payload = parse_payload(body, self.headers.get("Content-Type"))
+        except ValueError as e:
+            return self._reply(400, f"Invalid payload: {e}")
+        self.server.log.append(event, self.headers.get("X-GitHub-Delivery"), payload)
+        self.server.events.put((event, payload))
+        self._reply(202, "Queued")
+
+    def _reply(self, status, message):
+        body = message.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _next_batch(events, batch_seconds):
+    """Events received within batch_seconds of the first one, or [] when none arrives for a second."""
+    try:
+        batch = [events.get(timeout=1)]
+    except queue.Empty:
+        return []
+    deadline = time.monotonic() + batch_seconds
+    while (remaining := deadline - time.monotonic()) > 0:
+        try:
+            batch.append(events.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _apply(ingester, batch):
+    try:
+        ingester.ingest(batch)
+    except Exception as e:
+        # The events are recorded, replaying the recording applies them later
+        print(f"❌ Could not apply {len(batch)} events: {e}")
+
+
+def _reconcile(ingester):
+    try:
+        reconcile(ingester)
+    except Exception as e:
+        # The endpoint keeps receiving events, the next interval tries again
+        print(f"❌ Could not reconcile with the GitHub API: {e}")
+
+
+def serve(host=WEBHOOK_HOST, port=WEBHOOK_PORT, ingester=None, secret=WEBHOOK_SECRET,
+          batch_seconds=WEBHOOK_BATCH_SECONDS, reconcile_hours=WEBHOOK_RECONCILE_HOURS):
+    """Receive webhooks on host:port and apply them in batches until interrupted."""
+    ingester = ingester or WebhookIngester()
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.secret = secret
+    server.log = EventLog()
+    server.events = queue.Queue()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"✓ Receiving webhooks on http://{host}:{port}/ (Ctrl+C to stop)")
+    if not secret:
+        print("Note: WEBHOOK_SECRET is not set, deliveries are not verified.")
+    if reconcile_hours and not GITHUB_TOKEN:
+        print("Note: GITHUB_TOKEN is not set, reconciliation with the API is disabled.")
+        reconcile_hours = 0
+    next_reconcile = time.monotonic() + reconcile_hours * 3600 if reconcile_hours else None
+    # Stopped like Ctrl+C when terminated, so queued events are applied
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        while True:
+            batch = _next_batch(server.events, batch_seconds)
+            if batch:
+                _apply(ingester, batch)
+            if next_reconcile is not None and time.monotonic() >= next_reconcile:
+                _reconcile(ingester)
+                next_reconcile = time.monotonic() + reconcile_hours * 3600
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+        batch = []
+        while not server.events.empty():
+            batch.append(server.events.get())
+        if batch:
+            _apply(ingester, batch)
+
+
+def main(args):
+    """Serve the endpoint, or apply the recordings given after --replay."""
+    if args and args[0] == "--replay":
+        if len(args) == 1:
+            print("Error: --replay needs the recordings to replay.")
+            sys.exit(1)
+        replay(args[1:])
+    else:
+        serve()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Command line interface of GitHub Team Wrapped
+
+Every subcommand only imports what it needs, so commands start fast and the
+offline ones (analytics, web, sql, serve, query, ingest) work without a GitHub token.
+
+Usage:
+    python wrapped.py run [--profile]
+    python wrapped.py collect [--incremental] [--graphql] [--profile]
+    python wrapped.py analytics
+    python wrapped.py web
+    python wrapped.py deploy [--skip-collection] [--incremental] [--graphql] [--no-push] [--force] [--profile]
+    python wrapped.py sql [--tables | --wrapped | "SELECT ..."]
+    python wrapped.py serve
+    python wrapped.py query wrapped|user|repo|teams [--team NAME] [--login LOGIN] [--repo NAME]
+    python wrapped.py ingest [--port PORT] [--replay RECORDING ...]
+"""
+import argparse
+import json
+import sys
+
+
+def _require_token():
+    """Exit with the error when no GitHub token is configured."""
+    from config import require_token
+    try:
+        require_token()
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+def run(args):
+    _require_token()
+    from run_metrics import metrics
+    from main import main
+    metrics.profile = args.profile
+    main()
+
+
+def collect(args):
+    _require_token()
+    from config import COLLECTION_BACKEND
+    from run_metrics import metrics
+    from data_collection import main
+    metrics.profile = args.profile
+    main(args.incremental, "graphql" if args.graphql else COLLECTION_BACKEND)
+
+
+def analytics(args):
+    from analytics import main
+    main()
+
+
+def web(args):
+    from generate_web_stats import generate_all_stats_json
+    generate_all_stats_json()
+
+
+def deploy(args):
+    if not args.skip_collection:
+        _require_token()
+    from update_and_deploy import main
+    flags = [f"--{name.replace('_', '-')}" for name in
+             ("skip_collection", "incremental", "graphql", "no_push", "force", "profile") if getattr(args, name)]
+    return main(flags)
+
+
+def sql(args):
+    from sql_store import main
+    if args.tables:
+        main(["--tables"])
+    else:
+        main(["--wrapped"] if args.wrapped else args.sql)
+
+
+def serve(args):
+    from stats_daemon import serve
+    try:
+        serve()
+    except (RuntimeError, FileNotFoundError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+def query(args):
+    """Answer a stats query with the daemon, or in this process when no daemon is running."""
+    from stats_daemon import request
+    query = {"query": args.query}
+    for name in ("team", "login", "repo"):
+        if getattr(args, name) is not None:
+            query[name] = getattr(args, name)
+    try:
+        result = request(query)
+        if result is None:
+            from stats_daemon import StatsService
+            result = StatsService().answer(query)
+    except (RuntimeError, ValueError, FileNotFoundError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(json.dumps(result, indent=2, default=int))
+
+
+def ingest(args):
+    """Receive webhooks, or apply recorded ones with --replay."""
+    import webhooks
+    from config import WEBHOOK_PORT
+    if args.replay:
+        webhooks.replay(args.replay)
+    else:
+        webhooks.serve(port=args.port or WEBHOOK_PORT)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="wrapped.py", description="GitHub Team Wrapped")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("run", help="collect, analyze and generate the web stats (main.py)")
+    command.add_argument("--profile", action="store_true", help="profile every stage with cProfile")
+    command.set_defaults(handler=run)
+
+    command = commands.add_parser("collect", help="collect data from the GitHub API")
+    command.add_argument("--incremental", action="store_true", help="only fetch data newer than the last run")
+    command.add_argument("--graphql", action="store_true", help="collect with the GraphQL API")
+    command.add_argument("--profile", action="store_true", help="profile every stage with cProfile")
+    command.set_defaults(handler=collect)
+
+    command = commands.add_parser("analytics", help="print the results of every team")
+    command.set_defaults(handler=analytics)
+
+    command = commands.add_parser("web", help="generate the stats files and shards of the web interface")
+    command.set_defaults(handler=web)
+
+    command = commands.add_parser("deploy", help="update the stats and deploy them to GitHub Pages")
+    command.add_argument("--skip-collection", action="store_true", help="use the existing data files")
+    command.add_argument("--incremental", action="store_true", help="only fetch data newer than the last run")
+    command.add_argument("--graphql", action="store_true", help="collect with the GraphQL API")
+    command.add_argument("--no-push", action="store_true", help="commit the changes without pushing them")
+    command.add_argument("--force", action="store_true", help="run every stage, even unchanged ones")
+    command.add_argument("--profile", action="store_true", help="profile every stage with cProfile")
+    command.set_defaults(handler=deploy)
+
+    command = commands.add_parser("sql", help="query the SQL store")
+    command.add_argument("sql", nargs="*", help="SQL query (default: list the tables)")
+    command.add_argument("--tables", action="store_true", help="list the tables and their row counts")
+    command.add_argument("--wrapped", action="store_true", help="print the results of every team, with SQL")
+    command.set_defaults(handler=sql)
+
+    command = commands.add_parser("serve", help="keep the data loaded and answer queries on a local socket")
+    command.set_defaults(handler=serve)
+
+    command = commands.add_parser("query", help="print stats as JSON, from the daemon when it is running")
+    command.add_argument("query", choices=["wrapped", "user", "repo", "teams"])
+    command.add_argument("--team", help="team name (default: the first team)")
+    command.add_argument("--login", help="member login, for user")
+    command.add_argument("--repo", help="repository name, for repo")
+    command.set_defaults(handler=query)
+
+    command = commands.add_parser("ingest", help="apply GitHub webhooks to the data as they arrive")
+    command.add_argument("--port", type=int, default=None, help="port of the endpoint (default: WEBHOOK_PORT)")
+    command.add_argument("--replay", nargs="+", metavar="RECORDING", help="apply recorded events instead")
+    command.set_defaults(handler=ingest)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    required = {"user": "login", "repo": "repo"}.get(getattr(args, "query", None))
+    if required and getattr(args, required) is None:
+        parser.error(f"query {args.query} needs --{required}")
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() in (None, True) else 1)